@@ -0,0 +1,263 @@
+import argparse
+import itertools
+import multiprocessing
+import os
+import shutil
+import subprocess
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PIL import GifImagePlugin, Image
+
+from lensing_core import (
+    ANIMATION_FRAME_COUNT,
+    DEFAULT_PARAMS,
+    LIGHT_CURVE_SAMPLES,
+    MAGNIFICATION_MODELS,
+    animation_current_points,
+    compute_animation_frames,
+)
+from lensing_plot import (
+    R_E_display,
+    cache_background,
+    configure_korean_font,
+    create_figure,
+    create_light_curve_artists,
+    create_lensing_artists,
+    render_frame,
+    update_light_curve,
+    update_lensing_visualization,
+)
+from sweep import parse_param_spec
+
+# --- 애니메이션 파일 내보내기 (MP4 / GIF / PNG 연속 이미지) ---
+# 예)
+#   python animation_export.py --param planet_mass_ratio=1e-4,1e-3 --param u_lens_y_impact_parameter=0.1,0.5 \
+#       --format mp4 --workers 8 --output videos
+# 파라미터 조합마다 animation_00000.mp4, animation_00001.mp4, ... (png면 animation_00000/frame_00000.png, ...)를 씁니다.
+# 프레임은 프로세스 풀에서 그리고(워커마다 그림 한 벌), 순서대로 받아 인코더로 바로 흘려보냅니다.
+# 진행 중인 프레임은 최대 2 x 워커 수개이므로 프레임 수와 관계없이 메모리 사용량이 일정합니다.
+
+EXPORT_FORMATS = {'mp4': '.mp4', 'gif': '.gif', 'png': ''}
+LENSING_FIGSIZE = (8, 5) # 앱의 시스템 시각화와 같은 크기
+LIGHT_CURVE_FIGSIZE = (8, 4) # 앱의 밝기 곡선과 같은 크기
+
+
+def prepare_animation(params, model='approximate', adaptive=False, n_frames=ANIMATION_FRAME_COUNT):
+    """파라미터(빠진 값은 DEFAULT_PARAMS)로 모든 프레임을 그리는 데 필요한 배열을 계산합니다."""
+    params = {**DEFAULT_PARAMS, **params}
+    u_values_x = np.linspace(-3.0, 3.0, LIGHT_CURVE_SAMPLES) * params['relative_velocity_factor']
+    planet_x_frames, planet_y_frames, magnifications_frames, u_values_x_sampled = compute_animation_frames(
+        u_values_x,
+        params['u_lens_y_impact_parameter'],
+        params['planet_initial_angle_deg'],
+        params['planet_orbital_period_factor'],
+        params['planet_separation_from_lens'],
+        params['planet_mass_ratio'],
+        params['source_radius_ratio'],
+        n_frames=n_frames,
+        magnification_fn=MAGNIFICATION_MODELS[model],
+        adaptive=adaptive
+    )
+    lens_x_ratio_frames, current_mag_frames = animation_current_points(u_values_x, u_values_x_sampled, magnifications_frames)
+    return {
+        'u_values_x': u_values_x_sampled,
+        'lens_x_ratio_frames': lens_x_ratio_frames,
+        'lens_y_display': params['u_lens_y_impact_parameter'] * R_E_display,
+        'planet_x_frames': planet_x_frames,
+        'planet_y_frames': planet_y_frames,
+        'magnifications_frames': magnifications_frames,
+        'current_mag_frames': current_mag_frames,
+        'source_display_radius': params['source_radius_ratio'] * R_E_display * 5,
+    }
+
+
+# --- 워커 프로세스 상태: 그림과 배경은 워커마다 한 번만 만듭니다 ---
+_worker_state = {}
+
+
+def _init_worker(animation, dpi):
+    configure_korean_font()
+    fig_lensing, ax_lensing = create_figure(LENSING_FIGSIZE, dpi)
+    lensing_artists = create_lensing_artists(ax_lensing, animation['source_display_radius'])
+
+    # 전체 프레임 중 최댓값으로 Y축 상한을 고정 (앱의 애니메이션과 같은 방식)
+    magnification_min = animation['magnifications_frames'].min()
+    magnification_max = animation['magnifications_frames'].max()
+    fig_light_curve, ax_light_curve = create_figure(LIGHT_CURVE_FIGSIZE, dpi)
+    light_curve_artists = create_light_curve_artists(
+        ax_light_curve,
+        animation['u_values_x'],
+        animation['magnifications_frames'][0],
+        magnification_top=magnification_max + 0.05 * (magnification_max - magnification_min)
+    )
+    _worker_state.update(
+        animation=animation,
+        fig_lensing=fig_lensing, lensing_artists=lensing_artists, lensing_background=cache_background(fig_lensing),
+        fig_light_curve=fig_light_curve, light_curve_artists=light_curve_artists,
+        light_curve_background=cache_background(fig_light_curve),
+    )
+
+
+def _render_animation_frame(i):
+    """i번째 프레임: 시스템 시각화 위에 밝기 곡선을 이어 붙인 (높이 x 너비 x 3) RGB 배열"""
+    d = _worker_state
+    animation = d['animation']
+    current_lens_x_ratio = animation['lens_x_ratio_frames'][i]
+
+    update_lensing_visualization(
+        current_lens_x_ratio * R_E_display,
+        animation['lens_y_display'],
+        animation['planet_x_frames'][i],
+        animation['planet_y_frames'][i],
+        d['lensing_artists']
+    )
+    lensing_image = render_frame(d['fig_lensing'], d['lensing_background'], d['lensing_artists'].values())[..., :3]
+
+    update_light_curve(
+        animation['magnifications_frames'][i],
+        current_lens_x_ratio,
+        animation['current_mag_frames'][i],
+        d['light_curve_artists']
+    )
+    light_curve_image = render_frame(d['fig_light_curve'], d['light_curve_background'],
+                                     d['light_curve_artists'].values())[..., :3]
+    return np.concatenate([lensing_image, light_curve_image], axis=0)
+
+
+def iter_rendered_frames(animation, dpi=100, workers=None):
+    """
+    모든 프레임을 프로세스 풀에서 그려 순서대로 내보냅니다.
+    동시에 요청해 두는 프레임은 2 x 워커 수개까지이므로, 인코더가 느려도 메모리에 프레임이 쌓이지 않습니다.
+    """
+    workers = workers or os.cpu_count()
+    frame_indices = iter(range(len(animation['lens_x_ratio_frames'])))
+    # Streamlit 서버처럼 스레드가 많은 프로세스에서 fork하지 않도록 spawn으로 워커를 띄움
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                             initializer=_init_worker, initargs=(animation, dpi)) as executor:
+        pending = deque(executor.submit(_render_animation_frame, i) for i in itertools.islice(frame_indices, 2 * workers))
+        while pending:
+            frame = pending.popleft().result()
+            next_index = next(frame_indices, None)
+            if next_index is not None:
+                pending.append(executor.submit(_render_animation_frame, next_index))
+            yield frame
+
+
+class PngSequenceWriter:
+    """프레임마다 PNG 파일 하나를 씁니다 (frame_00000.png, frame_00001.png, ...)."""
+
+    def __init__(self, output_path, fps):
+        self.output_path = output_path
+        self._index = 0
+        os.makedirs(output_path, exist_ok=True)
+
+    def write(self, frame):
+        Image.fromarray(frame).save(os.path.join(self.output_path, f"frame_{self._index:05d}.png"))
+        self._index += 1
+
+    def close(self):
+        pass
+
+
+class GifWriter:
+    """프레임마다 팔레트를 따로 만들어 GIF 파일에 바로 이어 씁니다 (모든 프레임을 모아 두지 않음)."""
+
+    def __init__(self, output_path, fps):
+        self._file = open(output_path, 'wb')
+        self._duration_ms = 1000 / fps
+        self._header_written = False
+
+    def write(self, frame):
+        image = Image.fromarray(frame).quantize(256)
+        if not self._header_written:
+            header, _ = GifImagePlugin.getheader(image, info={'loop': 0})
+            self._file.writelines(header)
+            self._header_written = True
+        self._file.writelines(GifImagePlugin.getdata(image, duration=self._duration_ms, include_color_table=True))
+
+    def close(self):
+        self._file.write(b';')
+        self._file.close()
+
+
+class FfmpegWriter:
+    """ffmpeg 프로세스의 표준 입력으로 RGB 프레임을 흘려보내 H.264 MP4를 만듭니다 (ffmpeg 필요)."""
+
+    def __init__(self, output_path, fps):
+        if shutil.which('ffmpeg') is None:
+            raise SystemExit("MP4 출력에는 ffmpeg가 필요합니다: https://ffmpeg.org/download.html")
+        self.output_path = output_path
+        self.fps = fps
+        self._process = None
+
+    def write(self, frame):
+        if self._process is None:
+            height, width, _ = frame.shape
+            self._process = subprocess.Popen(
+                ['ffmpeg', '-y', '-loglevel', 'error', '-f', 'rawvideo', '-pix_fmt', 'rgb24',
+                 '-s', f'{width}x{height}', '-r', str(self.fps), '-i', '-',
+                 # yuv420p는 짝수 크기만 허용하므로 필요하면 한 픽셀 채움
+                 '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2', '-c:v', 'libx264', '-pix_fmt', 'yuv420p', self.output_path],
+                stdin=subprocess.PIPE
+            )
+        self._process.stdin.write(np.ascontiguousarray(frame).tobytes())
+
+    def close(self):
+        if self._process is not None:
+            self._process.stdin.close()
+            if self._process.wait() != 0:
+                raise RuntimeError(f"ffmpeg가 오류로 종료되었습니다 (코드 {self._process.returncode})")
+
+
+EXPORT_WRITERS = {'mp4': FfmpegWriter, 'gif': GifWriter, 'png': PngSequenceWriter}
+
+
+def export_animation(params, output_path, export_format='mp4', model='approximate', adaptive=False, fps=20, dpi=100,
+                     workers=None, progress_callback=None):
+    """
+    한 파라미터 조합의 애니메이션을 output_path에 씁니다 (png면 디렉터리).
+    progress_callback(완료된 프레임 수, 전체 프레임 수)는 프레임이 인코더에 들어갈 때마다 호출됩니다.
+    """
+    animation = prepare_animation(params, model, adaptive)
+    n_frames = len(animation['lens_x_ratio_frames'])
+    writer = EXPORT_WRITERS[export_format](output_path, fps)
+    try:
+        for done, frame in enumerate(iter_rendered_frames(animation, dpi, workers), start=1):
+            writer.write(frame)
+            if progress_callback is not None:
+                progress_callback(done, n_frames)
+    finally:
+        writer.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="미세 중력 렌즈 애니메이션을 동영상/GIF/PNG 연속 이미지로 내보내기")
+    parser.add_argument('--param', action='append', type=parse_param_spec, default=[], metavar='NAME=SPEC',
+                        help="파라미터: 이름=값1,값2,... 또는 이름=시작:끝:개수[:log] (조합마다 파일 하나, 여러 번 지정 가능)")
+    parser.add_argument('--model', choices=list(MAGNIFICATION_MODELS), default='approximate', help="증폭률 계산 모델")
+    parser.add_argument('--adaptive', action='store_true', help="적응형 밝기 곡선 샘플링 사용")
+    parser.add_argument('--format', choices=list(EXPORT_FORMATS), default='mp4', help="출력 형식")
+    parser.add_argument('--fps', type=int, default=20, help="초당 프레임 수")
+    parser.add_argument('--dpi', type=int, default=100, help="그림 해상도 (dpi)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="프로세스 수")
+    parser.add_argument('--output', required=True, help="출력 디렉터리")
+    args = parser.parse_args(argv)
+
+    names = [name for name, _ in args.param]
+    combinations = list(itertools.product(*(values for _, values in args.param)))
+    os.makedirs(args.output, exist_ok=True)
+    for index, values in enumerate(combinations):
+        params = dict(zip(names, (float(v) for v in values)))
+        output_path = os.path.join(args.output, f"animation_{index:05d}{EXPORT_FORMATS[args.format]}")
+        start = time.perf_counter()
+        export_animation(params, output_path, args.format, args.model, args.adaptive, args.fps, args.dpi, args.workers)
+        description = ", ".join(f"{name}={value:g}" for name, value in params.items()) or "기본 파라미터"
+        print(f"[{index + 1}/{len(combinations)}] {output_path} ({description}, {time.perf_counter() - start:.1f}초)",
+              flush=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,336 @@
+import argparse
+import datetime
+import io
+import itertools
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+import time
+
+import matplotlib
+import numpy as np
+from PIL import Image
+
+from animation_export import LENSING_FIGSIZE, LIGHT_CURVE_FIGSIZE, prepare_animation
+from lensing_core import (
+    DEFAULT_PARAMS,
+    LIGHT_CURVE_SAMPLES,
+    MAGNIFICATION_MODELS,
+    adaptive_sample,
+    calculate_magnification,
+    compute_animation_frames,
+    compute_planet_position,
+)
+from lensing_plot import (
+    DISPLAY_DPI,
+    R_E_display,
+    cache_background,
+    configure_korean_font,
+    create_figure,
+    create_light_curve_artists,
+    create_lensing_artists,
+    render_frame,
+    update_light_curve,
+    update_lensing_visualization,
+)
+
+# --- 성능 벤치마크 (브라우저 없이 실행하는 명령줄 도구) ---
+# 예)
+#   python benchmark.py run --output baseline.json
+#   python benchmark.py run --output current.json --filter '^(kernel|render)/'
+#   python benchmark.py compare baseline.json current.json --threshold 0.1
+# 항목마다 한 번 미리 실행(워밍업)한 뒤, 표본 하나가 MIN_SAMPLE_SECONDS 이상 걸리도록 반복 횟수를 정해 여러 표본을 잽니다.
+# app/ 항목은 Streamlit의 스크립트 실행 테스트 도구(AppTest)로 main.py를 새 프로세스에서 실행해 잽니다.
+# 비교는 표본의 중앙값 기준이며, 기준보다 threshold 비율 이상 느려진 항목이 있으면 종료 코드 1로 끝납니다.
+
+MAIN_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+KERNEL_SOURCE_SIZES = (0.001, 0.01, 0.1)
+KERNEL_MASS_RATIOS = (1e-6, 1e-4, 1e-2)
+KERNEL_FRAMES = 101 # 증폭률 계산 입력: (행성 위치 수 x 샘플 수) = 애니메이션 전체 프레임과 같은 모양
+MIN_SAMPLE_SECONDS = 0.05
+DEFAULT_REPEAT = 7
+DEFAULT_APP_REPEAT = 3 # app/ 항목을 재는 프로세스 수 (콜드 스타트 표본 수)
+DEFAULT_APP_RERUNS = 5 # 프로세스마다 재는 다시 실행 횟수
+DEFAULT_THRESHOLD = 0.10
+
+
+def measure(fn, repeat=DEFAULT_REPEAT, min_sample_seconds=MIN_SAMPLE_SECONDS):
+    """fn 한 번 호출에 걸리는 시간(초) 표본 repeat개. 첫 호출은 워밍업으로 버립니다."""
+    start = time.perf_counter()
+    fn()
+    first_call = time.perf_counter() - start
+    number = max(1, int(np.ceil(min_sample_seconds / max(first_call, 1e-9))))
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        samples.append((time.perf_counter() - start) / number)
+    return samples
+
+
+# --- 벤치마크 항목: (이름, 준비 함수 -> 잴 함수, 한 번 호출에서 계산하는 점 수 또는 None) ---
+def kernel_cases():
+    """calculate_magnification 처리량: 광원 크기 x 행성 질량비마다 (101 x 300) 점을 한 번에 계산"""
+    planet_x, planet_y = compute_planet_position(np.linspace(0, 360, KERNEL_FRAMES)[:, np.newaxis], 0, 1, 1.0)
+    u_values_x = np.linspace(-3.0, 3.0, LIGHT_CURVE_SAMPLES)
+    for source_size, mass_ratio in itertools.product(KERNEL_SOURCE_SIZES, KERNEL_MASS_RATIOS):
+        def setup(source_size=source_size, mass_ratio=mass_ratio):
+            return lambda: calculate_magnification(-u_values_x, -0.5, planet_x, planet_y, mass_ratio, source_size)
+        yield (f"kernel/calculate_magnification/rho={source_size:g}/q={mass_ratio:g}", setup,
+               KERNEL_FRAMES * LIGHT_CURVE_SAMPLES)
+
+
+def curve_cases(models):
+    """앱의 정적인 밝기 곡선 하나와 애니메이션 전체 프레임 계산 (캐시 없이, 모델 x 샘플링 방식마다)"""
+    u_values_x = np.linspace(-3.0, 3.0, LIGHT_CURVE_SAMPLES) * DEFAULT_PARAMS['relative_velocity_factor']
+    args = (DEFAULT_PARAMS['u_lens_y_impact_parameter'], DEFAULT_PARAMS['planet_initial_angle_deg'],
+            DEFAULT_PARAMS['planet_orbital_period_factor'], DEFAULT_PARAMS['planet_separation_from_lens'],
+            DEFAULT_PARAMS['planet_mass_ratio'], DEFAULT_PARAMS['source_radius_ratio'])
+    for model, adaptive in itertools.product(models, (False, True)):
+        sampling = 'adaptive' if adaptive else 'uniform'
+
+        def setup_static(model=model, adaptive=adaptive):
+            magnification_fn = MAGNIFICATION_MODELS[model]
+            planet_x, planet_y = compute_planet_position(args[1], 0, args[2], args[3])
+
+            def magnifications_of_x(x):
+                return magnification_fn(-x, -args[0], planet_x, planet_y, args[4], args[5])
+
+            # main.py의 compute_static_curve와 같은 계산 (곡선 + 현재 슬라이더 지점)
+            def static_curve():
+                if adaptive:
+                    adaptive_sample(magnifications_of_x, u_values_x[0], u_values_x[-1])
+                else:
+                    magnifications_of_x(u_values_x)
+                magnifications_of_x(u_values_x[0])
+            return static_curve
+
+        def setup_animation(model=model, adaptive=adaptive):
+            return lambda: compute_animation_frames(u_values_x, *args, magnification_fn=MAGNIFICATION_MODELS[model],
+                                                    adaptive=adaptive)
+
+        yield f"static_curve/{model}/{sampling}", setup_static, None
+        yield f"animation_precompute/{model}/{sampling}", setup_animation, None
+
+
+def render_cases():
+    """애니메이션 한 프레임 그리기 (시스템 시각화 + 밝기 곡선)와 그 PNG 인코딩"""
+    def setup_frame():
+        configure_korean_font()
+        animation = prepare_animation({})
+        fig_lensing, ax_lensing = create_figure(LENSING_FIGSIZE, DISPLAY_DPI)
+        lensing_artists = create_lensing_artists(ax_lensing, animation['source_display_radius'])
+        lensing_background = cache_background(fig_lensing)
+        fig_light_curve, ax_light_curve = create_figure(LIGHT_CURVE_FIGSIZE, DISPLAY_DPI)
+        magnification_max = animation['magnifications_frames'].max()
+        light_curve_artists = create_light_curve_artists(ax_light_curve, animation['u_values_x'],
+                                                         animation['magnifications_frames'][0],
+                                                         magnification_top=1.05 * magnification_max)
+        light_curve_background = cache_background(fig_light_curve)
+        frame_indices = itertools.cycle(range(len(animation['lens_x_ratio_frames'])))
+
+        def render_one_frame():
+            i = next(frame_indices)
+            current_lens_x_ratio = animation['lens_x_ratio_frames'][i]
+            update_lensing_visualization(current_lens_x_ratio * R_E_display, animation['lens_y_display'],
+                                         animation['planet_x_frames'][i], animation['planet_y_frames'][i],
+                                         lensing_artists)
+            update_light_curve(animation['magnifications_frames'][i], current_lens_x_ratio,
+                               animation['current_mag_frames'][i], light_curve_artists)
+            return (render_frame(fig_lensing, lensing_background, lensing_artists.values()),
+                    render_frame(fig_light_curve, light_curve_background, light_curve_artists.values()))
+        return render_one_frame
+
+    def setup_png_encode():
+        frames = setup_frame()()
+
+        # st.image가 하는 것처럼 RGBA 배열을 PNG로 인코딩
+        def encode():
+            for frame in frames:
+                Image.fromarray(frame).save(io.BytesIO(), format='PNG')
+        return encode
+
+    yield "render/frame", setup_frame, None
+    yield "render/png_encode", setup_png_encode, None
+
+
+APP_CASES = ("app/cold_start", "app/rerun_changed", "app/rerun_unchanged")
+
+
+def app_probe(reruns):
+    """
+    (하위 프로세스에서 실행) main.py를 AppTest로 처음 실행하는 시간과, 이후 다시 실행하는 시간.
+    rerun_changed: 행성 초기 각도를 바꿔 밝기 곡선을 새로 계산, rerun_unchanged: 같은 파라미터로 다시 실행
+    """
+    from streamlit.testing.v1 import AppTest
+
+    timings = {name: [] for name in APP_CASES}
+    app = AppTest.from_file(MAIN_SCRIPT, default_timeout=600)
+    start = time.perf_counter()
+    app.run()
+    timings["app/cold_start"].append(time.perf_counter() - start)
+    if app.exception:
+        raise SystemExit(f"main.py 실행 중 오류: {app.exception[0].message}")
+
+    for k in range(reruns):
+        angle_slider = next(slider for slider in app.sidebar.slider if slider.label.startswith("행성 초기 각도"))
+        angle_slider.set_value((k + 1) * 10 % 360)
+        start = time.perf_counter()
+        app.run()
+        timings["app/rerun_changed"].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        app.run()
+        timings["app/rerun_unchanged"].append(time.perf_counter() - start)
+    print(json.dumps(timings))
+
+
+def measure_app(app_repeat, reruns):
+    """app/ 항목의 표본: 콜드 스타트를 재기 위해 프로세스마다 새 인터프리터에서 app_probe를 실행"""
+    samples = {name: [] for name in APP_CASES}
+    for _ in range(app_repeat):
+        completed = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), 'app-probe', '--reruns', str(reruns)],
+            cwd=os.path.dirname(MAIN_SCRIPT), capture_output=True, text=True,
+            env={**os.environ, 'PYTHONWARNINGS': 'ignore'}
+        )
+        if completed.returncode != 0:
+            raise SystemExit(f"app-probe 실패:\n{completed.stderr}")
+        # 마지막 줄이 결과 (앞의 출력은 main.py나 Streamlit의 메시지)
+        for name, values in json.loads(completed.stdout.strip().splitlines()[-1]).items():
+            samples[name].extend(values)
+    return samples
+
+
+def summarize(samples, points=None):
+    result = {'unit': 's', 'median': float(np.median(samples)), 'min': float(np.min(samples)),
+              'samples': [float(v) for v in samples]}
+    if points is not None:
+        result['points'] = points
+        result['points_per_second'] = points / result['median']
+    return result
+
+
+def environment_metadata():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=os.path.dirname(MAIN_SCRIPT),
+                                capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    try:
+        import streamlit
+        streamlit_version = streamlit.__version__
+    except ImportError:
+        streamlit_version = None
+    return {
+        'timestamp': datetime.datetime.now().astimezone().isoformat(timespec='seconds'),
+        'git_commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'matplotlib': matplotlib.__version__,
+        'streamlit': streamlit_version,
+    }
+
+
+def format_seconds(seconds):
+    if seconds >= 1:
+        return f"{seconds:.3f} s"
+    if seconds >= 1e-3:
+        return f"{seconds * 1e3:.3f} ms"
+    return f"{seconds * 1e6:.1f} µs"
+
+
+def run_benchmarks(args):
+    selected = re.compile(args.filter)
+    cases = itertools.chain(kernel_cases(), curve_cases(args.models), render_cases())
+    results = {}
+    for name, setup, points in cases:
+        if not selected.search(name):
+            continue
+        results[name] = summarize(measure(setup(), args.repeat), points)
+        throughput = f"  ({results[name]['points_per_second']:,.0f} 점/초)" if points else ""
+        print(f"{name:60s} {format_seconds(results[name]['median']):>12s}{throughput}", flush=True)
+
+    if any(selected.search(name) for name in APP_CASES):
+        for name, samples in measure_app(args.app_repeat, args.app_reruns).items():
+            if selected.search(name):
+                results[name] = summarize(samples)
+                print(f"{name:60s} {format_seconds(results[name]['median']):>12s}", flush=True)
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump({'metadata': environment_metadata(), 'results': results}, f, indent=2, ensure_ascii=False)
+    print(f"결과를 {args.output}에 저장했습니다 ({len(results)}개 항목).")
+
+
+def compare_results(args):
+    """중앙값을 비교해 항목별 변화율을 출력합니다. threshold를 넘게 느려진 항목이 있으면 1을 돌려줍니다."""
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = json.load(f)['results']
+    with open(args.current, encoding='utf-8') as f:
+        current = json.load(f)['results']
+
+    regressions = []
+    print(f"{'항목':60s} {'기준':>12s} {'현재':>12s} {'변화':>9s}")
+    for name in sorted(baseline.keys() & current.keys()):
+        change = current[name]['median'] / baseline[name]['median'] - 1
+        if change > args.threshold:
+            verdict = "  느려짐"
+            regressions.append(name)
+        elif change < -args.threshold:
+            verdict = "  빨라짐"
+        else:
+            verdict = ""
+        print(f"{name:60s} {format_seconds(baseline[name]['median']):>12s} "
+              f"{format_seconds(current[name]['median']):>12s} {change:+9.1%}{verdict}")
+    for name in sorted(baseline.keys() - current.keys()):
+        print(f"{name:60s} (현재 결과에 없음)")
+    for name in sorted(current.keys() - baseline.keys()):
+        print(f"{name:60s} (새 항목)")
+
+    if regressions:
+        print(f"\n{len(regressions)}개 항목이 기준보다 {args.threshold:.0%} 넘게 느려졌습니다: {', '.join(regressions)}")
+        return 1
+    print(f"\n기준보다 {args.threshold:.0%} 넘게 느려진 항목이 없습니다.")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="미세 중력 렌즈 시뮬레이션 성능 벤치마크")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = subparsers.add_parser('run', help="벤치마크를 실행해 JSON으로 저장")
+    run_parser.add_argument('--output', default='benchmark_results.json', help="결과 JSON 파일")
+    run_parser.add_argument('--filter', default='', help="이름이 이 정규식과 맞는 항목만 실행 (예: '^kernel/')")
+    run_parser.add_argument('--models', nargs='+', choices=list(MAGNIFICATION_MODELS), default=list(MAGNIFICATION_MODELS),
+                            help="static_curve/, animation_precompute/ 항목에서 잴 증폭률 모델")
+    run_parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT, help="항목마다 재는 표본 수")
+    run_parser.add_argument('--app-repeat', type=int, default=DEFAULT_APP_REPEAT,
+                            help="app/ 항목을 재는 프로세스 수 (콜드 스타트 표본 수)")
+    run_parser.add_argument('--app-reruns', type=int, default=DEFAULT_APP_RERUNS, help="프로세스마다 재는 다시 실행 횟수")
+
+    compare_parser = subparsers.add_parser('compare', help="두 결과 JSON을 비교 (느려진 항목이 있으면 종료 코드 1)")
+    compare_parser.add_argument('baseline', help="기준 결과 JSON")
+    compare_parser.add_argument('current', help="비교할 결과 JSON")
+    compare_parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                                help="중앙값이 이 비율보다 더 늘어나면 느려진 것으로 판정 (0.1 = 10%%)")
+
+    probe_parser = subparsers.add_parser('app-probe', help=argparse.SUPPRESS)
+    probe_parser.add_argument('--reruns', type=int, default=DEFAULT_APP_RERUNS)
+
+    args = parser.parse_args(argv)
+    if args.command == 'run':
+        run_benchmarks(args)
+    elif args.command == 'compare':
+        sys.exit(compare_results(args))
+    else:
+        app_probe(args.reruns)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,167 @@
+import numpy as np
+
+from diagnostics import count_calls
+
+# --- 이중 렌즈(렌즈 별 + 행성) 점 광원 정확해: 5차 다항식의 근 ---
+# 복소 좌표계에서 렌즈 별(질량 1)은 원점, 행성(질량 mass_ratio)은 z2 = u_planet_x + i u_planet_y에 있습니다.
+# 길이 단위는 렌즈 별의 아인슈타인 반경입니다.
+# 렌즈 방정식: zeta = z - 1 / conj(z) - q / (conj(z) - conj(z2))
+# 켤레를 취해 conj(z)를 z의 유리식으로 바꾼 뒤 대입하면 z에 대한 5차 다항식이 됩니다.
+
+IMAGE_TOLERANCE = 1e-10 # 다듬은 근이 렌즈 방정식을 만족한다고 보는 잔차 |f| / (1 + |k|) 허용 오차
+NEWTON_STEPS = 2 # 고유값으로 구한 근을 다항식 위에서 다듬는 뉴턴 반복 횟수
+LENS_NEWTON_STEPS = 3 # 그 근을 렌즈 방정식 위에서 다시 다듬는 뉴턴 반복 횟수
+
+
+def _polymul(p, r):
+    """(배치, 차수+1) 모양의 계수 배열(최고차항부터) 두 개를 배치별로 곱합니다."""
+    out = np.zeros(p.shape[:-1] + (p.shape[-1] + r.shape[-1] - 1,), dtype=complex)
+    for i in range(p.shape[-1]):
+        out[..., i:i + r.shape[-1]] += p[..., i:i + 1] * r
+    return out
+
+
+def _polyval(p, z):
+    """배치별 다항식 p를 배치별 점들 z (배치, 점 수)에서 호너 방법으로 계산합니다."""
+    value = np.zeros_like(z)
+    for i in range(p.shape[-1]):
+        value = value * z + p[..., i:i + 1]
+    return value
+
+
+def binary_lens_polynomial(zeta, z2, mass_ratio):
+    """
+    광원 위치 zeta마다 이중 렌즈 방정식의 5차 다항식 계수 (배치, 6)를 만듭니다.
+    conj(z) = N(z) / D(z),  N = conj(zeta) D + (z - z2) + q z,  D = z (z - z2)
+    (z - zeta) A B - D B - q D A = 0,  A = N,  B = N - conj(z2) D
+    """
+    ones = np.ones_like(zeta)
+    zeros = np.zeros_like(zeta)
+    # 2차 다항식 D, N, A, B (최고차항부터)
+    D = np.stack([ones, -z2, zeros], axis=-1)
+    N = np.conj(zeta)[..., np.newaxis] * D + np.stack([zeros, 1 + mass_ratio, -z2], axis=-1)
+    A = N
+    B = N - np.conj(z2)[..., np.newaxis] * D
+    z_minus_zeta = np.stack([ones, -zeta], axis=-1)
+
+    AB = _polymul(A, B)
+    polynomial = _polymul(z_minus_zeta, AB)
+    polynomial[..., 1:] -= _polymul(D, B) + mass_ratio[..., np.newaxis] * _polymul(D, A)
+    return polynomial
+
+
+def batched_roots(polynomial):
+    """
+    (배치, n+1) 계수 배열의 모든 근을 동반 행렬(companion matrix)의 고유값으로 한 번에 구합니다.
+    반복문에서 np.roots를 호출하지 않고 np.linalg.eigvals를 배치로 한 번만 호출합니다.
+    """
+    degree = polynomial.shape[-1] - 1
+    companion = np.zeros(polynomial.shape[:-1] + (degree, degree), dtype=complex)
+    companion[..., 0, :] = -polynomial[..., 1:] / polynomial[..., :1]
+    companion[..., np.arange(1, degree), np.arange(degree - 1)] = 1
+    roots = np.linalg.eigvals(companion)
+
+    # 뉴턴 반복으로 근의 정확도를 높임
+    derivative = polynomial[..., :-1] * np.arange(degree, 0, -1)
+    for _ in range(NEWTON_STEPS):
+        slope = _polyval(derivative, roots)
+        step = _polyval(polynomial, roots) / np.where(slope == 0, 1, slope)
+        roots = roots - np.where(np.isfinite(step), step, 0)
+    return roots
+
+
+def _lens_residual(roots, zeta, z2, q):
+    """렌즈 방정식 f(z) = z - 1/conj(z) - q/(conj(z) - conj(z2)) - zeta 와 k = d zeta / d conj(z)"""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        conj_roots = np.conj(roots)
+        f = roots - 1 / conj_roots - q / (conj_roots - np.conj(z2)) - zeta
+        k = 1 / conj_roots**2 + q / (conj_roots - np.conj(z2))**2
+    return f, k
+
+
+def polish_on_lens_equation(roots, zeta, z2, q, steps=LENS_NEWTON_STEPS):
+    """
+    다항식의 근을 렌즈 방정식 자체에 대한 뉴턴 반복으로 다듬습니다.
+    f는 z와 conj(z)의 함수이므로 f + dz + k conj(dz) = 0 을 풀면 dz = (-f + k conj(f)) / (1 - |k|^2) 입니다.
+    q가 작으면 행성 근처 이미지의 다항식 근이 부정확해지는데, 렌즈 방정식 위에서는 기계 정밀도까지 수렴합니다.
+    잔차가 줄어드는 경우에만 옮기므로 가짜 근이 멀리 떠돌지 않습니다.
+    반환하는 잔차는 |f| / (1 + |k|) 입니다. 행성 바로 옆 이미지는 |k|가 매우 커서 근의 마지막 자리 반올림만으로도
+    |f|가 |k| 배 커지므로, 그만큼 나눠야 이미지끼리 비교할 수 있습니다.
+    """
+    f, k = _lens_residual(roots, zeta, z2, q)
+    residual = np.abs(f)
+    for _ in range(steps):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            step = (-f + k * np.conj(f)) / (1 - np.abs(k)**2)
+        candidate = roots + np.where(np.isfinite(step), step, 0)
+        f_new, k_new = _lens_residual(candidate, zeta, z2, q)
+        better = np.abs(f_new) < residual
+        roots = np.where(better, candidate, roots)
+        f = np.where(better, f_new, f)
+        k = np.where(better, k_new, k)
+        residual = np.where(better, np.abs(f_new), residual)
+    return roots, residual / (1 + np.abs(k))
+
+
+def solve_binary_lens_images(zeta, z2, mass_ratio):
+    """
+    광원 위치마다 이미지 위치 후보 5개와, 그중 실제 이미지인지 나타내는 마스크를 반환합니다.
+    이중 렌즈의 이미지는 항상 3개 또는 5개이므로, 고정된 잔차 기준 대신
+    잔차가 가장 작은 근 3개는 항상 이미지로 두고, 나머지 두 근은 둘 다 렌즈 방정식을 만족할 때만 이미지로 셉니다.
+    (q = 0 이면 점 렌즈의 이미지 2개만 셉니다.)
+    """
+    zeta = zeta[..., np.newaxis]
+    z2 = z2[..., np.newaxis]
+    q = mass_ratio[..., np.newaxis]
+    roots = batched_roots(binary_lens_polynomial(zeta[..., 0], z2[..., 0], mass_ratio))
+    roots, residual = polish_on_lens_equation(roots, zeta, z2, q)
+    residual = np.where(np.isfinite(residual), residual, np.inf)
+
+    # 다듬는 동안 같은 이미지로 모인 근은 한 번만 셈 (잔차가 더 큰 쪽을 버림)
+    order = np.argsort(residual, axis=-1)
+    roots = np.take_along_axis(roots, order, axis=-1)
+    residual = np.take_along_axis(residual, order, axis=-1)
+    scale = np.maximum(1, np.abs(roots))
+    close = np.abs(roots[..., :, np.newaxis] - roots[..., np.newaxis, :]) < 1e-8 * scale[..., :, np.newaxis]
+    duplicate = np.tril(close, k=-1).any(axis=-1)
+    residual = np.where(duplicate, np.inf, residual)
+    order = np.argsort(residual, axis=-1, kind='stable')
+    roots = np.take_along_axis(roots, order, axis=-1)
+    residual = np.take_along_axis(residual, order, axis=-1)
+
+    five_images = residual[..., 4] < IMAGE_TOLERANCE * np.maximum(1, np.abs(zeta[..., 0]))
+    is_image = np.ones(roots.shape, dtype=bool)
+    is_image[..., 3:] = five_images[..., np.newaxis]
+    # 행성이 없으면 (q = 0) 점 렌즈이므로 이미지는 2개
+    is_image[..., 2:] &= q > 0
+    return roots, is_image
+
+
+@count_calls # 진단 모드에서 실행별 호출 수와 점 수를 셈
+def calculate_magnification_polynomial(u_source_x, u_source_y, u_planet_x, u_planet_y, mass_ratio, source_size):
+    """
+    이중 렌즈 방정식을 정확히 풀어 구한 점 광원 증폭률 (calculate_magnification과 같은 인자).
+    모든 광원 위치의 다항식을 한 번에 풀고, 실제 이미지의 야코비안 증폭률 1/|det J|를 더합니다.
+    점 광원 해이므로 source_size는 사용하지 않습니다.
+    """
+    u_source_x, u_source_y, u_planet_x, u_planet_y, mass_ratio, source_size = np.broadcast_arrays(
+        *(np.asarray(v, dtype=float) for v in (u_source_x, u_source_y, u_planet_x, u_planet_y, mass_ratio, source_size))
+    )
+    shape = u_source_x.shape
+
+    zeta = (u_source_x + 1j * u_source_y).ravel()
+    z2 = (u_planet_x + 1j * u_planet_y).ravel()
+    q = mass_ratio.ravel()
+    # 광원이 렌즈 위치에 정확히 놓이면 최고차항 계수가 0이 되므로 아주 조금 옮김
+    zeta = np.where(np.abs(zeta) < 1e-10, 1e-10, zeta)
+    zeta = np.where(np.abs(zeta - z2) < 1e-10, zeta + 1e-10, zeta)
+
+    roots, is_image = solve_binary_lens_images(zeta, z2, q)
+
+    # det J = 1 - |d zeta / d conj(z)|^2,  d zeta / d conj(z) = 1 / conj(z)^2 + q / (conj(z) - conj(z2))^2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        shear = 1 / np.conj(roots)**2 + q[:, np.newaxis] / (np.conj(roots) - np.conj(z2[:, np.newaxis]))**2
+        image_magnification = 1 / np.abs(1 - np.abs(shear)**2)
+    magnification = np.where(is_image, image_magnification, 0).sum(axis=-1)
+
+    return magnification.reshape(shape)[()]
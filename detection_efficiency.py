@@ -0,0 +1,69 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from lensing_core import MAGNIFICATION_MODELS, compute_planet_position
+
+# --- 몬테카를로 행성 검출 효율 지도 ---
+# (행성 질량비, 행성-렌즈 별 거리) 격자의 각 칸마다 충격 인자, 행성 공전 위상, 광원 크기를 무작위로 뽑아
+# 밝기 곡선을 계산하고, 단일 렌즈 곡선과의 차이가 문턱값을 넘는 비율(검출 확률)을 구합니다.
+
+DETECTION_THRESHOLD = 0.05 # 단일 렌즈 곡선 대비 상대 편차가 이 값을 넘으면 행성 신호로 판정
+IMPACT_PARAMETER_RANGE = (0.0, 1.5) # 사이드바 "렌즈 시스템 경로 Y 위치" 슬라이더 범위
+SOURCE_SIZE_RANGE = (0.001, 0.1) # 사이드바 "광원 별의 크기" 슬라이더 범위
+
+
+def simulate_detection_probability(mass_ratio, separation, n_trials, seed, model='approximate',
+                                   threshold=DETECTION_THRESHOLD, n_samples=300):
+    """
+    한 칸(mass_ratio, separation)의 검출 확률.
+    n_trials개의 무작위 궤적을 (n_trials x n_samples) 배열로 한 번에 계산합니다.
+    seed가 같으면 결과도 항상 같습니다.
+    """
+    rng = np.random.default_rng(seed)
+    impact_parameter = rng.uniform(*IMPACT_PARAMETER_RANGE, size=(n_trials, 1))
+    planet_phase_deg = rng.uniform(0, 360, size=(n_trials, 1))
+    source_size = rng.uniform(*SOURCE_SIZE_RANGE, size=(n_trials, 1))
+
+    u_values_x = np.linspace(-3.0, 3.0, n_samples)
+    planet_x, planet_y = compute_planet_position(planet_phase_deg, 0, 1, separation)
+
+    magnification_fn = MAGNIFICATION_MODELS[model]
+    with_planet = magnification_fn(-u_values_x, -impact_parameter, planet_x, planet_y, mass_ratio, source_size)
+    # 기준 곡선도 같은 모델로 계산해야 모델 자체의 오차(광선 추적 지도의 이산화 등)가 행성 신호로 잡히지 않음
+    single_lens = magnification_fn(-u_values_x, -impact_parameter, planet_x, planet_y, 0.0, source_size)
+
+    deviation = np.abs(with_planet - single_lens) / single_lens
+    return np.mean(deviation.max(axis=-1) > threshold)
+
+
+def _simulate_cell(task):
+    i, j, mass_ratio, separation, n_trials, seed, model, threshold = task
+    return i, j, simulate_detection_probability(mass_ratio, separation, n_trials, seed, model, threshold)
+
+
+def compute_detection_map(mass_ratios, separations, n_trials=500, base_seed=0, model='approximate',
+                          threshold=DETECTION_THRESHOLD, workers=None, progress_callback=None):
+    """
+    (len(mass_ratios) x len(separations)) 검출 확률 지도를 프로세스 풀에서 계산합니다.
+    칸마다 (base_seed, i, j)로 만든 시드를 쓰므로 작업 순서나 프로세스 수와 관계없이 결과가 같습니다.
+    progress_callback(완료된 칸 수, 전체 칸 수, 지금까지의 지도)는 칸이 끝날 때마다 호출됩니다.
+    """
+    detection_map = np.full((len(mass_ratios), len(separations)), np.nan)
+    tasks = [
+        (i, j, float(q), float(s), n_trials, np.random.SeedSequence([base_seed, i, j]), model, threshold)
+        for i, q in enumerate(mass_ratios)
+        for j, s in enumerate(separations)
+    ]
+
+    # Streamlit 서버처럼 스레드가 많은 프로세스에서 fork하지 않도록 spawn으로 워커를 띄움
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+        futures = [executor.submit(_simulate_cell, task) for task in tasks]
+        for done, future in enumerate(as_completed(futures), start=1):
+            i, j, probability = future.result()
+            detection_map[i, j] = probability
+            if progress_callback is not None:
+                progress_callback(done, len(tasks), detection_map)
+
+    return detection_map
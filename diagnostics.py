@@ -0,0 +1,128 @@
+import contextlib
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+# --- 진단 모드: 실행 단계별 시간 측정과 Chrome 트레이스 ---
+# 스크립트 실행(또는 애니메이션 프레임) 하나마다 Recorder 하나를 만들고, 단계를 span()으로 감쌉니다.
+# 기록한 구간은 Chrome 트레이스 이벤트("X")로 바꿔 chrome://tracing 이나 https://ui.perfetto.dev 에서 열 수 있습니다.
+# count_calls로 감싼 함수는 현재 스레드에서 활성화된 Recorder에 호출 수와 계산한 점 수를 더합니다.
+# (Streamlit은 세션마다 다른 스레드에서 스크립트를 실행하므로 세션별로 따로 셉니다.)
+
+ROLLING_WINDOW = 200 # 단계별 백분위수를 계산하는 최근 측정값 수
+TRACE_EVENT_LIMIT = 20000 # 세션에 보관하는 트레이스 이벤트 수 상한
+PERCENTILES = (50, 90, 99)
+# 설정하면 세션마다 트레이스 파일 하나를 이 디렉터리에 쓰고, 실행이 끝날 때마다 갱신합니다.
+DIAGNOSTICS_TRACE_DIR = os.environ.get("DIAGNOSTICS_TRACE_DIR")
+
+_active_recorder = contextvars.ContextVar('active_recorder', default=None)
+
+
+class Recorder:
+    """한 번의 실행 동안 단계별 구간 (이름, 분류, 시작 시각, 걸린 시간)과 함수 호출 수를 모읍니다."""
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.origin = time.perf_counter()
+        self.spans = []
+        self.call_counts = {} # 함수 이름 -> [호출 수, 계산한 점 수]
+
+    def activate(self):
+        """현재 스레드의 호출 수를 이 Recorder에 세도록 합니다 (꺼져 있으면 세지 않음)."""
+        _active_recorder.set(self if self.enabled else None)
+        return self
+
+    @contextlib.contextmanager
+    def span(self, name, category='stage'):
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.spans.append((name, category, start, time.perf_counter() - start))
+
+    def record_total(self, name, category='total'):
+        """Recorder를 만든 때부터 지금까지를 한 구간으로 기록합니다 (실행 전체 시간)."""
+        if self.enabled:
+            self.spans.append((name, category, self.origin, time.perf_counter() - self.origin))
+
+    def add_calls(self, name, n_points):
+        counts = self.call_counts.setdefault(name, [0, 0])
+        counts[0] += 1
+        counts[1] += n_points
+
+    def stage_totals(self):
+        """단계 이름별 걸린 시간의 합 (초). 같은 단계가 여러 번 나오면 더합니다."""
+        totals = {}
+        for name, _, _, duration in self.spans:
+            totals[name] = totals.get(name, 0.0) + duration
+        return totals
+
+    def trace_events(self, label='rerun'):
+        """Chrome 트레이스 이벤트 목록. 호출 수는 실행이 끝난 시각의 카운터 이벤트("C")로 붙입니다."""
+        pid, tid = os.getpid(), threading.get_ident()
+        events = [
+            {'name': name, 'cat': category, 'ph': 'X', 'ts': start * 1e6, 'dur': duration * 1e6, 'pid': pid, 'tid': tid}
+            for name, category, start, duration in self.spans
+        ]
+        if self.call_counts:
+            end = max((start + duration for _, _, start, duration in self.spans), default=self.origin)
+            events.extend(
+                {'name': name, 'cat': label, 'ph': 'C', 'ts': end * 1e6, 'pid': pid, 'tid': tid,
+                 'args': {'calls': calls, 'points': points}}
+                for name, (calls, points) in self.call_counts.items()
+            )
+        return events
+
+
+def count_calls(fn):
+    """활성화된 Recorder가 있으면 fn의 호출 수와 반환된 증폭률 배열의 원소 수를 셉니다."""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        result = fn(*args, **kwargs)
+        recorder = _active_recorder.get()
+        if recorder is not None:
+            recorder.add_calls(fn.__name__, np.size(result))
+        return result
+    return wrapper
+
+
+class RollingStats:
+    """단계별 최근 ROLLING_WINDOW개 측정값과 그 백분위수"""
+
+    def __init__(self, window=ROLLING_WINDOW):
+        self.window = window
+        self.samples = {}
+
+    def add(self, name, seconds):
+        self.samples.setdefault(name, deque(maxlen=self.window)).append(seconds)
+
+    def add_recorder(self, recorder, prefix=''):
+        for name, seconds in recorder.stage_totals().items():
+            self.add(prefix + name, seconds)
+
+    def percentiles(self, percentiles=PERCENTILES):
+        """{단계 이름: (측정 수, 백분위수별 값(초)...)}"""
+        return {
+            name: (len(values), *np.percentile(np.fromiter(values, float), percentiles))
+            for name, values in self.samples.items()
+        }
+
+
+def chrome_trace_json(events):
+    return json.dumps({'traceEvents': list(events), 'displayTimeUnit': 'ms'})
+
+
+def write_chrome_trace(path, events):
+    """트레이스 이벤트를 Chrome 트레이스 JSON 파일로 씁니다."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(chrome_trace_json(events))
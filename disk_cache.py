@@ -0,0 +1,51 @@
+import glob
+import os
+import time
+
+# --- 디스크 캐시 디렉터리의 크기/나이 제한 ---
+# 캐시 파일을 읽을 때마다 수정 시각을 갱신해 (touch) 최근 사용 시각으로 쓰고,
+# 새 파일을 쓴 뒤 가장 오래 쓰지 않은 파일부터 지워 전체 크기(와 나이)를 제한합니다.
+# (접근 시각 atime은 noatime/relatime으로 마운트된 디스크에서 갱신되지 않으므로 쓰지 않습니다.)
+# 다른 프로세스가 메모리 맵으로 열어 둔 파일을 지워도 POSIX에서는 맵이 닫힐 때까지 내용이 남습니다.
+
+
+def touch(path):
+    """캐시 파일을 방금 사용한 것으로 표시합니다."""
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+def evict_least_recently_used(directory, pattern, max_bytes, max_age_seconds=None, keep=()):
+    """
+    directory에서 pattern과 맞는 파일을 최근 사용 순으로 남기고, 합계가 max_bytes를 넘거나
+    max_age_seconds보다 오래 쓰지 않은 파일을 지웁니다. keep에 있는 경로는 지우지 않습니다.
+    반환값: 지운 파일 수
+    """
+    entries = []
+    for path in glob.glob(os.path.join(directory, pattern)):
+        if '.tmp.' in os.path.basename(path):
+            continue # 다른 프로세스가 쓰는 중인 임시 파일 ("<이름>.<pid>.tmp.npy")
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+    entries.sort(reverse=True)
+
+    keep = {os.path.abspath(path) for path in keep}
+    now = time.time()
+    total_bytes = 0
+    removed = 0
+    for mtime, size, path in entries:
+        too_old = max_age_seconds is not None and now - mtime > max_age_seconds
+        if os.path.abspath(path) not in keep and (too_old or total_bytes + size > max_bytes):
+            try:
+                os.remove(path)
+                removed += 1
+                continue
+            except OSError:
+                pass # 다른 프로세스가 먼저 지웠거나 (Windows에서) 열려 있는 파일
+        total_bytes += size
+    return removed
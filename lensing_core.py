@@ -0,0 +1,235 @@
+import numpy as np
+
+from magnification_map import calculate_magnification_raytrace
+from binary_lens import calculate_magnification_polynomial
+from diagnostics import count_calls
+
+# --- 미세 중력 렌즈 시뮬레이션 핵심 계산 (Streamlit 없이 import 가능) ---
+
+# --- 물리 상수 ---
+G = 6.67430e-11  # 중력 상수 (m^3 kg^-1 s^-2)
+c = 2.99792458e8 # 빛의 속도 (m/s)
+M_sun = 1.989e30 # 태양 질량 (kg)
+PC_TO_METER = 3.0857e16 # 1 파섹(pc) = 3.0857e16 미터
+
+# 사이드바 슬라이더의 기본값
+DEFAULT_PARAMS = {
+    'planet_initial_angle_deg': 0,
+    'lens_mass_solar': 1.0,
+    'source_radius_ratio': 0.005,
+    'planet_mass_ratio': 1e-4,
+    'planet_separation_from_lens': 1.0,
+    'relative_velocity_factor': 1.0,
+    'observer_lens_distance_kpc': 8.0,
+    'u_lens_y_impact_parameter': 0.5,
+    'planet_orbital_period_factor': 1.0,
+    'animation_progress': 0,
+}
+
+LIGHT_CURVE_SAMPLES = 300 # 밝기 곡선의 기본 샘플 수
+
+
+def compute_einstein_radius_angle(lens_mass_solar, observer_lens_distance_kpc):
+    """렌즈 별 질량(태양 질량)과 관측자-렌즈 거리(kpc)로부터 아인슈타인 반경 (라디안)"""
+    D_L = observer_lens_distance_kpc * 1000 * PC_TO_METER 
+    D_S = D_L + (500 * PC_TO_METER) 
+    D_LS = D_S - D_L
+
+    M_lens = lens_mass_solar * M_sun
+
+    return np.sqrt(4 * G * M_lens / (c**2) * D_LS / (D_L * D_S))
+
+
+def compute_planet_position(planet_initial_angle_deg, progress, planet_orbital_period_factor, planet_separation):
+    """시뮬레이션 진행도(0~1)에서 행성의 렌즈 별 기준 공전 위치 (아인슈타인 반경 단위)"""
+    planet_angle_rad = np.deg2rad(planet_initial_angle_deg + progress * 360 / planet_orbital_period_factor)
+    return planet_separation * np.cos(planet_angle_rad), planet_separation * np.sin(planet_angle_rad)
+
+
+# --- 중력 렌즈 광도 증폭 계산 함수 ---
+@count_calls # 진단 모드에서 실행별 호출 수와 점 수를 셈
+def calculate_magnification(u_source_x, u_source_y, u_planet_x, u_planet_y, mass_ratio, source_size):
+    """
+    미세 중력 렌즈 광도 증폭률 계산 (단순화된 근사)
+    u_source_x, u_source_y: 배경 별의 렌즈 중심으로부터의 상대적 X, Y 위치 (아인슈타인 반경 단위)
+    u_planet_x, u_planet_y: 행성의 렌즈 별로부터의 X, Y 위치 (아인슈타인 반경 단위)
+    모든 인자는 스칼라 또는 NumPy 배열이며, 브로드캐스팅된 모양의 증폭률 배열을 반환합니다.
+    (모든 인자가 스칼라이면 스칼라를 반환합니다.)
+    배열로 계산한 값은 예전 스칼라 버전을 점마다 부른 값과 최대 2 ulp 정도 다를 수 있습니다.
+    NumPy 스칼라의 x**2는 pow()로 계산되어 가끔 1 ulp 틀리지만, 배열의 x**2는 정확히 반올림된 x*x이기 때문입니다.
+    """
+    u_source_x, u_source_y, u_planet_x, u_planet_y, mass_ratio, source_size = np.broadcast_arrays(
+        *(np.asarray(v, dtype=float) for v in (u_source_x, u_source_y, u_planet_x, u_planet_y, mass_ratio, source_size))
+    )
+
+    # 주 렌즈(렌즈 별)에 의한 증폭
+    u_main = np.sqrt(u_source_x**2 + u_source_y**2)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # 거의 중심에 가까울 때 (특이점 방지): 유한한 광원 크기를 고려한 중심 증폭률, 점 광원이면 무한대
+        mag_center = np.where(source_size > 0, (u_main**2 + 2) / (np.sqrt(u_main**2 + 4) * source_size), 1e6)
+        mag_point = (u_main**2 + 2) / (u_main * np.sqrt(u_main**2 + 4))
+    mag_main = np.where(u_main < 1e-6, mag_center, mag_point)
+
+    magnification = np.minimum(mag_main, 1e4)
+
+    # 행성에 의한 추가 증폭/감폭 효과 (근접 근사)
+    dist_to_planet = np.sqrt((u_source_x - u_planet_x)**2 + (u_source_y - u_planet_y)**2)
+
+    # 행성 근처에서 발생하는 추가 증폭 (범프)
+    near_planet = dist_to_planet < 0.1 + source_size + (mass_ratio * 10)
+    additional_mag = (mass_ratio / (dist_to_planet**2 + 0.001)) * 50
+    magnification = np.where(near_planet, magnification + additional_mag, magnification)
+
+    # 행성 그림자를 통과할 때의 감폭 효과 (딥)
+    in_shadow = near_planet & (dist_to_planet < source_size * 0.5)
+    magnification = np.where(in_shadow, np.maximum(magnification * (1 - mass_ratio * 500), 1.0), magnification)
+
+    return magnification[()]
+
+
+ANIMATION_FRAME_COUNT = 101 # 애니메이션 프레임 수 (진행도 0~100%)
+
+
+def adaptive_sample(magnification_of_x, x_min, x_max, initial_points=61, curvature_tolerance=2e-3,
+                    gradient_tolerance=0.05, max_evaluations=600):
+    """
+    밝기 곡선을 적응형으로 샘플링합니다.
+    magnification_of_x: X 위치 배열을 받아 (..., X 개수) 모양의 증폭률을 돌려주는 함수.
+    (여러 곡선을 한 번에 넘기면 모든 곡선에 공통인 격자를 만듭니다.)
+    성긴 균일 격자에서 시작해, 이웃 점을 잇는 직선에서 벗어난 정도(곡률)나 한 구간의 변화량(기울기)이
+    허용 오차를 넘는 구간을 반으로 나누기를 반복합니다. 전체 계산 횟수는 max_evaluations를 넘지 않습니다.
+    반환값: (정렬된 비균일 X 격자, (..., X 개수) 증폭률)
+    """
+    x = np.linspace(x_min, x_max, initial_points)
+    values = np.asarray(magnification_of_x(x), dtype=float)
+    evaluations = len(x)
+    min_spacing = (x_max - x_min) * 1e-5
+
+    while evaluations < max_evaluations:
+        scale = np.maximum(np.abs(values), 1.0)
+
+        # 내부 점이 양옆 점을 잇는 직선에서 벗어난 정도 (상대값, 여러 곡선 중 최댓값)
+        t = (x[1:-1] - x[:-2]) / (x[2:] - x[:-2])
+        linear = values[..., :-2] + (values[..., 2:] - values[..., :-2]) * t
+        deviation = (np.abs(values[..., 1:-1] - linear) / scale[..., 1:-1]).reshape(-1, len(x) - 2).max(axis=0)
+        # 구간의 양 끝 점 중 하나라도 많이 벗어나면 그 구간을 나눔
+        curvature_score = np.zeros(len(x) - 1)
+        curvature_score[:-1] = deviation
+        curvature_score[1:] = np.maximum(curvature_score[1:], deviation)
+
+        jump = (np.abs(np.diff(values, axis=-1)) / scale[..., :-1]).reshape(-1, len(x) - 1).max(axis=0)
+        score = np.maximum(curvature_score / curvature_tolerance, jump / gradient_tolerance)
+
+        refine = np.nonzero((score > 1) & (np.diff(x) > 2 * min_spacing))[0]
+        if len(refine) == 0:
+            break
+        budget = max_evaluations - evaluations
+        if len(refine) > budget:
+            # 남은 계산 횟수 안에서 오차가 큰 구간부터 나눔
+            refine = np.sort(refine[np.argsort(score[refine])[::-1][:budget]])
+
+        new_x = (x[refine] + x[refine + 1]) / 2
+        new_values = np.asarray(magnification_of_x(new_x), dtype=float)
+        evaluations += len(new_x)
+
+        order = np.argsort(np.concatenate([x, new_x]), kind='stable')
+        x = np.concatenate([x, new_x])[order]
+        values = np.concatenate([values, new_values], axis=-1)[..., order]
+
+    return x, values
+
+
+def compute_animation_frames(u_values_x, u_lens_y, planet_initial_angle_deg, planet_orbital_period_factor,
+                             planet_separation, mass_ratio, source_size, n_frames=ANIMATION_FRAME_COUNT,
+                             magnification_fn=calculate_magnification, adaptive=False):
+    """
+    애니메이션 전체 프레임의 밝기 곡선을 한 번에 계산합니다.
+    반환값: (프레임별 행성 X 위치, 프레임별 행성 Y 위치, (프레임 수 x 샘플 수) 증폭률 배열, 샘플 X 격자)
+    행성 각도가 360도 주기로 반복되는 프레임은 같은 행을 공유하여 다시 계산하지 않습니다.
+    adaptive가 True이면 u_values_x의 범위에서 모든 프레임에 공통인 적응형 격자를 사용합니다.
+    """
+    progress = np.arange(n_frames) / (n_frames - 1)
+    planet_angles_deg = planet_initial_angle_deg + progress * 360 / planet_orbital_period_factor
+
+    # 360도로 나눈 나머지가 같은 각도는 한 번만 계산
+    # (나머지를 구한 뒤 반올림해야 123.4와 3723.4 % 360처럼 끝자리만 다른 값이 묶이고,
+    #  반올림으로 360이 된 359.99999999995 같은 값은 다시 나머지를 구해 0과 같은 각도로 묶임)
+    _, first_frame_idx, row_of_frame = np.unique(
+        np.mod(np.round(np.mod(planet_angles_deg, 360), 9), 360), return_index=True, return_inverse=True
+    )
+    unique_angles_rad = np.deg2rad(planet_angles_deg[first_frame_idx])
+    unique_planet_x = planet_separation * np.cos(unique_angles_rad)
+    unique_planet_y = planet_separation * np.sin(unique_angles_rad)
+
+    def unique_magnifications_of_x(x):
+        # (고유 각도 수 x 샘플 수)로 브로드캐스팅하여 계산
+        return magnification_fn(
+            u_source_x=-x[np.newaxis, :],
+            u_source_y=-u_lens_y,
+            u_planet_x=unique_planet_x[:, np.newaxis],
+            u_planet_y=unique_planet_y[:, np.newaxis],
+            mass_ratio=mass_ratio,
+            source_size=source_size
+        )
+
+    if adaptive:
+        u_values_x, unique_magnifications = adaptive_sample(unique_magnifications_of_x, u_values_x[0], u_values_x[-1])
+    else:
+        unique_magnifications = unique_magnifications_of_x(u_values_x)
+
+    row_of_frame = row_of_frame.reshape(-1)
+    return (
+        unique_planet_x[row_of_frame],
+        unique_planet_y[row_of_frame],
+        unique_magnifications[row_of_frame],
+        np.array(u_values_x)
+    )
+
+
+def animation_current_points(u_values_x, u_values_x_sampled, magnifications_frames):
+    """
+    프레임별 렌즈 시스템 X 위치(진행도에 따른 u_values_x의 격자 점)와 그 지점의 증폭률.
+    증폭률은 샘플 격자에서 보간합니다 (균일 격자에서는 격자 점의 값 그대로).
+    """
+    n_frames = len(magnifications_frames)
+    lens_x_ratio_frames = u_values_x[(np.arange(n_frames) / (n_frames - 1) * (len(u_values_x) - 1)).astype(int)]
+    current_mag_frames = np.array([
+        np.interp(lens_x_ratio_frames[i], u_values_x_sampled, magnifications_frames[i])
+        for i in range(n_frames)
+    ])
+    return lens_x_ratio_frames, current_mag_frames
+
+
+# 증폭률 모델 이름별 함수 (모두 calculate_magnification과 같은 인자)
+MAGNIFICATION_MODELS = {
+    'approximate': calculate_magnification,
+    'raytrace': calculate_magnification_raytrace,
+    'polynomial': calculate_magnification_polynomial,
+}
+
+
+def compute_light_curve(params, model='approximate', n_samples=LIGHT_CURVE_SAMPLES):
+    """
+    사이드바 파라미터(빠진 값은 DEFAULT_PARAMS)에 대한 밝기 곡선.
+    파라미터 값은 스칼라 또는 같은 모양의 배열이며, 배열이면 곡선 여러 개를 한 번에 계산합니다.
+    행성 위치는 animation_progress(0~100) 시점의 위치를 사용합니다.
+    반환값: (렌즈 시스템 상대 X 위치, 증폭률), 모두 (파라미터 모양..., n_samples) 배열
+    """
+    params = {name: np.asarray(value, dtype=float)[..., np.newaxis] for name, value in {**DEFAULT_PARAMS, **params}.items()}
+    u_values_x = params['relative_velocity_factor'] * np.linspace(-3.0, 3.0, n_samples)
+    planet_x, planet_y = compute_planet_position(
+        params['planet_initial_angle_deg'],
+        params['animation_progress'] / 100,
+        params['planet_orbital_period_factor'],
+        params['planet_separation_from_lens']
+    )
+    magnifications = MAGNIFICATION_MODELS[model](
+        u_source_x=-u_values_x,
+        u_source_y=-params['u_lens_y_impact_parameter'],
+        u_planet_x=planet_x,
+        u_planet_y=planet_y,
+        mass_ratio=params['planet_mass_ratio'],
+        source_size=params['source_radius_ratio']
+    )
+    return u_values_x, magnifications
@@ -0,0 +1,175 @@
+import os
+
+import numpy as np
+import matplotlib
+import matplotlib.font_manager as fm
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from matplotlib.patches import Circle
+
+# --- 시스템 시각화와 밝기 곡선 그리기 (Streamlit 없이 import 가능) ---
+# pyplot의 전역 상태를 쓰지 않고 Agg 캔버스 위의 Figure만 사용하므로, 화면 없는 서버나 워커 프로세스에서도 그릴 수 있습니다.
+
+R_E_display = 40 # 시각화 스케일 팩터
+DISPLAY_DPI = 200 # 앱 화면에 보내는 그림의 해상도 (st.pyplot의 기본값과 같음)
+KOREAN_FONT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "NanumGothic.ttf")
+KOREAN_FONT_FAMILIES = ['NanumGothic', 'Malgun Gothic', 'AppleGothic']
+
+
+def configure_korean_font(font_path=KOREAN_FONT_PATH):
+    """
+    한글 폰트를 찾아 matplotlib 기본 폰트로 설정합니다 (폰트 파일이 있으면 등록, 없으면 설치된 한글 폰트).
+    반환값: 설정한 폰트 이름, 한글 폰트가 없으면 None
+    """
+    matplotlib.rcParams['axes.unicode_minus'] = False
+    if os.path.exists(font_path):
+        fm.fontManager.addfont(font_path)
+    installed = {font.name for font in fm.fontManager.ttflist}
+    for family in KOREAN_FONT_FAMILIES:
+        if family in installed:
+            matplotlib.rcParams['font.family'] = family
+            return family
+    return None
+
+
+def create_figure(figsize, dpi=100):
+    """Agg 캔버스에 붙은 Figure와 축 하나를 만듭니다."""
+    fig = Figure(figsize=figsize, dpi=dpi)
+    FigureCanvasAgg(fig)
+    return fig, fig.add_subplot()
+
+
+class FigurePool:
+    """
+    이름별 Figure와 축을 한 번만 만들어 다시 쓰고, 축과 배경까지 준비된 그림은 입력이 같으면 그대로 돌려줍니다.
+    Figure는 여러 스레드가 동시에 그리면 안 되므로 Streamlit 세션마다 풀 하나를 둡니다.
+    (pyplot의 전역 Figure 목록에 등록되지 않으므로 다시 실행할 때마다 Figure가 쌓이지 않습니다.)
+    """
+
+    def __init__(self, dpi=DISPLAY_DPI):
+        self.dpi = dpi
+        self._figures = {}
+        self._prepared = {}
+
+    def axes(self, name, figsize):
+        """name의 Figure와 비운 축. 처음 한 번만 만들고, 이후에는 지난번 그림을 지워서 돌려줍니다."""
+        if name not in self._figures:
+            self._figures[name] = create_figure(figsize, self.dpi)
+            return self._figures[name]
+        fig, ax = self._figures[name]
+        if len(fig.axes) > 1:
+            # 색 막대처럼 나중에 더한 축이 있으면 축 배치가 바뀌었으므로 Figure를 통째로 비움
+            fig.clear()
+            ax = fig.add_subplot()
+            self._figures[name] = (fig, ax)
+        else:
+            ax.cla()
+        return fig, ax
+
+    def prepared(self, name, key, build):
+        """key가 지난번과 같으면 지난번 build()의 결과(Figure, 아티스트, 배경 등)를, 다르면 새로 만든 결과를 돌려줍니다."""
+        entry = self._prepared.get(name)
+        if entry is None or entry[0] != key:
+            entry = (key, build())
+            self._prepared[name] = entry
+        return entry[1]
+
+
+def create_lensing_artists(ax_obj, source_display_radius):
+    """
+    시스템 시각화의 축과 아티스트(원, 라벨, 빛의 경로)를 한 번만 생성합니다.
+    배경 별은 고정된 정적 아티스트이고, 렌즈 별/행성/빛의 경로는 프레임마다 위치만 갱신되는 animated 아티스트입니다.
+    """
+    ax_obj.set_facecolor('black')
+    ax_obj.set_xlim(-100, 100)
+    ax_obj.set_ylim(-100, 100)
+    ax_obj.set_aspect('equal')
+    ax_obj.axis('off')
+
+    # 배경 별 (광원) 고정 그리기
+    # 배경 별은 화면 중앙 (0,0)에 완전히 고정됩니다.
+    ax_obj.add_artist(Circle((0, 0), source_display_radius, color='orange', zorder=4))
+    ax_obj.text(0, -15, '배경 별 (광원)', color='white', ha='center', fontsize=10)
+
+    # 렌즈 별 (동적으로 움직임)
+    lens_circle = Circle((0, 0), 10, color='yellow', zorder=5, animated=True)
+    ax_obj.add_artist(lens_circle)
+    lens_label = ax_obj.text(0, -15, '렌즈 별', color='white', ha='center', fontsize=10, animated=True)
+
+    # 외계 행성 (렌즈 별을 기준으로 공전)
+    planet_circle = Circle((0, 0), 4, color='gray', zorder=6, animated=True)
+    ax_obj.add_artist(planet_circle)
+    planet_label = ax_obj.text(0, 10, '외계 행성', color='white', ha='center', fontsize=10, animated=True)
+
+    # 빛의 경로 (개념적, 렌즈를 향해 휘어지는 이미지)
+    light_path, = ax_obj.plot([0, 0], [0, 0], color='purple', linestyle='-', linewidth=1, alpha=0.7, animated=True)
+
+    return {
+        'light_path': light_path,
+        'lens': lens_circle,
+        'lens_label': lens_label,
+        'planet': planet_circle,
+        'planet_label': planet_label,
+    }
+
+
+def update_lensing_visualization(current_lens_x_display, current_lens_y_display, current_planet_x_relative, current_planet_y_relative, lensing_artists):
+    """
+    현재 렌즈 별의 위치와 행성 위치에 따라 시스템 시각화를 업데이트합니다.
+    (배경별은 고정된 위치에 있고, 렌즈 시스템이 X축을 따라 움직입니다.)
+    아티스트를 새로 만들지 않고 위치와 선 데이터만 갱신합니다.
+    """
+    # 렌즈 별 (동적으로 움직임)
+    lens_display_x = current_lens_x_display
+    lens_display_y = current_lens_y_display
+    lensing_artists['lens'].set_center((lens_display_x, lens_display_y))
+    lensing_artists['lens_label'].set_position((lens_display_x, lens_display_y - 15))
+
+    # 외계 행성 (렌즈 별을 기준으로 공전)
+    # 행성의 위치는 렌즈 별의 위치에 상대적으로 더해집니다.
+    planet_abs_display_x = lens_display_x + (current_planet_x_relative * R_E_display) 
+    planet_abs_display_y = lens_display_y + (current_planet_y_relative * R_E_display) 
+    lensing_artists['planet'].set_center((planet_abs_display_x, planet_abs_display_y))
+    lensing_artists['planet_label'].set_position((planet_abs_display_x, planet_abs_display_y + 10))
+
+    # 고정된 배경 별에서 렌즈 별로 향하는 빛의 경로를 개념적으로 표현
+    lensing_artists['light_path'].set_data([0, lens_display_x], [0, lens_display_y])
+
+
+def create_light_curve_artists(ax_obj, u_values_x, magnifications_curve, magnification_top=None):
+    """
+    밝기 곡선 축(제목, 라벨, 격자, 범례)과 곡선/현재 지점 아티스트를 한 번만 생성합니다.
+    magnification_top이 주어지면 Y축 상한을 고정합니다 (애니메이션 중 축이 흔들리지 않도록).
+    """
+    curve_line, = ax_obj.plot(u_values_x, magnifications_curve, color='blue', linewidth=2, animated=True)
+    current_marker, = ax_obj.plot([u_values_x[0]], [magnifications_curve[0]], 'ro', markersize=8,
+                                  label='현재 렌즈 시스템 위치', animated=True)
+
+    ax_obj.set_title("배경 별 밝기 변화 (광도 증폭률)")
+    ax_obj.set_xlabel(f"렌즈 시스템 상대 X거리 (아인슈타인 반경의 배수)")
+    ax_obj.set_ylabel("광도 증폭률")
+    ax_obj.grid(True)
+    ax_obj.set_ylim(bottom=1.0, top=magnification_top)
+    ax_obj.legend()
+
+    return {'curve': curve_line, 'current_point': current_marker}
+
+
+def update_light_curve(magnifications_curve, current_lens_x_ratio, current_magnification, light_curve_artists):
+    """밝기 곡선과 현재 지점 표시의 데이터만 갱신합니다."""
+    light_curve_artists['curve'].set_ydata(magnifications_curve)
+    light_curve_artists['current_point'].set_data([current_lens_x_ratio], [current_magnification])
+
+
+def cache_background(fig):
+    """animated 아티스트를 제외한 정적인 부분(축, 라벨, 격자 등)을 한 번 그려 저장합니다."""
+    fig.canvas.draw()
+    return fig.canvas.copy_from_bbox(fig.bbox)
+
+
+def render_frame(fig, background, artists):
+    """저장된 배경 위에 animated 아티스트만 다시 그려 RGBA 이미지 배열로 반환합니다."""
+    fig.canvas.restore_region(background)
+    for artist in artists:
+        artist.axes.draw_artist(artist)
+    return np.asarray(fig.canvas.buffer_rgba())
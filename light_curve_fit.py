@@ -0,0 +1,245 @@
+import functools
+import io
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from lensing_core import MAGNIFICATION_MODELS, compute_planet_position
+
+# --- 관측 광도 곡선 맞춤 (피팅) ---
+# 시간 t의 렌즈 시스템 상대 X 위치: x = relative_velocity_factor * (t - t0) / t_scale
+# t_scale은 관측 기간의 1/6로, relative_velocity_factor = 1이면 관측 기간이 앱의 X 범위 [-3, 3]에 대응합니다.
+# 관측 플럭스 = source_flux * 증폭률 + blend_flux 이고, 두 플럭스는 매 평가마다 가중 최소제곱으로 정확히 풉니다.
+
+# 맞춤 파라미터와 범위 (t0는 관측 기간 안, 질량비는 log10로 맞춤)
+FIT_PARAMETERS = [
+    ('t0', None, None),
+    ('u_lens_y_impact_parameter', 0.0, 1.5),
+    ('relative_velocity_factor', 0.1, 2.0),
+    ('log10_planet_mass_ratio', -6.0, -2.0),
+    ('planet_separation_from_lens', 0.5, 2.0),
+    ('planet_phase_deg', 0.0, 360.0),
+    ('source_radius_ratio', 0.001, 0.1),
+]
+EARLY_STOP_MARGIN = 0.5 # 최적값보다 카이제곱이 이 비율 이상 나쁜 시작점은 중단
+ITERATIONS_PER_ROUND = 50 # 한 라운드에 시작점마다 진행하는 넬더-미드 반복 수
+MIN_ROUNDS_BEFORE_STOP = 2 # 조기 중단을 판단하기 전에 모든 시작점이 거치는 라운드 수
+CONVERGENCE_TOLERANCE = 1e-8 # 심플렉스의 카이제곱 값 퍼짐이 이보다 작으면 수렴
+# 맞춤에 쓸 수 있는 증폭률 모델. 광선 추적 지도는 (q, s)가 바뀔 때마다 새 지도를 계산해 디스크에 쓰므로
+# 목적 함수를 평가할 때마다 1초 넘게 걸려 맞춤에 쓸 수 없습니다.
+FIT_MODELS = ('approximate', 'polynomial')
+
+
+def load_photometry_csv(file):
+    """
+    시간, 플럭스[, 플럭스 오차] 열을 가진 CSV를 읽습니다. 첫 줄이 숫자가 아니면 머리글로 보고 건너뜁니다.
+    반환값: (time, flux, flux_err) 배열, 오차 열이 없으면 flux_err는 1
+    """
+    text = file.read()
+    if isinstance(text, bytes):
+        text = text.decode('utf-8')
+    first_line = text.lstrip().split('\n', 1)[0]
+    try:
+        [float(v) for v in first_line.split(',')]
+        skip_header = 0
+    except ValueError:
+        skip_header = 1
+    data = np.loadtxt(io.StringIO(text), delimiter=',', skiprows=skip_header, ndmin=2)
+    if data.shape[1] < 2:
+        raise ValueError("CSV에는 최소한 시간과 플럭스 두 열이 필요합니다.")
+    flux_err = data[:, 2] if data.shape[1] > 2 else np.ones(len(data))
+    check_photometry(data[:, 0], data[:, 1], flux_err)
+    return data[:, 0], data[:, 1], flux_err
+
+
+def check_photometry(time, flux, flux_err):
+    """
+    맞춤에 쓸 수 있는 관측 데이터인지 확인합니다. 아니면 ValueError를 냅니다.
+    시간 폭이 0이면 t_scale이 0이 되고, 오차가 0이면 가중치 1 / flux_err²가 무한대가 되어 카이제곱을 계산할 수 없습니다.
+    """
+    if not (np.all(np.isfinite(time)) and np.all(np.isfinite(flux)) and np.all(np.isfinite(flux_err))):
+        raise ValueError("시간, 플럭스, 플럭스 오차에 숫자가 아닌 값(NaN, inf)이 있습니다.")
+    if len(np.unique(time)) < 2:
+        raise ValueError("서로 다른 관측 시각이 최소한 두 개 필요합니다.")
+    if np.any(flux_err <= 0):
+        raise ValueError("플럭스 오차는 모두 0보다 커야 합니다.")
+
+
+def parameter_bounds(time):
+    lower = np.array([time.min() if name == 't0' else low for name, low, _ in FIT_PARAMETERS])
+    upper = np.array([time.max() if name == 't0' else high for name, _, high in FIT_PARAMETERS])
+    return lower, upper
+
+
+def unit_to_params(unit, lower, upper):
+    """[0, 1] 상자 좌표를 물리 파라미터로 바꿉니다. 위상은 주기적으로, 나머지는 범위 안으로 자릅니다."""
+    unit = np.array(unit, dtype=float)
+    phase = [name for name, _, _ in FIT_PARAMETERS].index('planet_phase_deg')
+    unit[phase] = np.mod(unit[phase], 1.0)
+    return lower + np.clip(unit, 0.0, 1.0) * (upper - lower)
+
+
+def model_magnification(params, time, t_scale, model='approximate'):
+    """맞춤 파라미터 벡터에서 모든 관측 시각의 증폭률을 한 번에 계산합니다."""
+    t0, impact_parameter, velocity, log10_mass_ratio, separation, phase_deg, source_size = params
+    lens_x = velocity * (time - t0) / t_scale
+    planet_x, planet_y = compute_planet_position(phase_deg, 0, 1, separation)
+    return MAGNIFICATION_MODELS[model](
+        u_source_x=-lens_x,
+        u_source_y=-impact_parameter,
+        u_planet_x=planet_x,
+        u_planet_y=planet_y,
+        mass_ratio=10**log10_mass_ratio,
+        source_size=source_size
+    )
+
+
+def fit_fluxes(magnification, flux, weight):
+    """flux ≈ source_flux * magnification + blend_flux 의 가중 최소제곱 해와 카이제곱"""
+    sw, sa, sf = weight.sum(), (weight * magnification).sum(), (weight * flux).sum()
+    saa, saf = (weight * magnification**2).sum(), (weight * magnification * flux).sum()
+    determinant = saa * sw - sa**2
+    if determinant == 0:
+        return 0.0, sf / sw, np.sum(weight * (flux - sf / sw)**2)
+    source_flux = (saf * sw - sa * sf) / determinant
+    blend_flux = (saa * sf - sa * saf) / determinant
+    chi2 = np.sum(weight * (flux - source_flux * magnification - blend_flux)**2)
+    return source_flux, blend_flux, chi2
+
+
+# --- 워커 프로세스 상태: 관측 데이터는 워커마다 한 번만 받습니다 ---
+_worker_data = {}
+
+
+def _init_worker(time, flux, flux_err, model):
+    _worker_data.update(
+        time=time, flux=flux, weight=1 / flux_err**2, model=model,
+        t_scale=(time.max() - time.min()) / 6, bounds=parameter_bounds(time)
+    )
+    _chi2.cache_clear()
+
+
+@functools.lru_cache(maxsize=4096)
+def _chi2(unit_key):
+    """같은 파라미터로 다시 평가하면 메모 캐시에서 바로 돌려줍니다."""
+    d = _worker_data
+    params = unit_to_params(np.array(unit_key), *d['bounds'])
+    magnification = model_magnification(params, d['time'], d['t_scale'], d['model'])
+    return fit_fluxes(magnification, d['flux'], d['weight'])[2]
+
+
+def _objective(unit):
+    return _chi2(tuple(np.round(unit, 12)))
+
+
+def nelder_mead_steps(f, simplex, values, n_iterations):
+    """넬더-미드 심플렉스를 n_iterations번 진행합니다. (중간에 멈췄다가 이어서 진행할 수 있도록 상태를 주고받음)"""
+    for _ in range(n_iterations):
+        order = np.argsort(values)
+        simplex, values = simplex[order], values[order]
+        if values[-1] - values[0] < CONVERGENCE_TOLERANCE * max(abs(values[0]), 1.0):
+            break
+        centroid = simplex[:-1].mean(axis=0)
+
+        reflected = centroid + (centroid - simplex[-1])
+        f_reflected = f(reflected)
+        if f_reflected < values[0]:
+            expanded = centroid + 2 * (centroid - simplex[-1])
+            f_expanded = f(expanded)
+            simplex[-1], values[-1] = (expanded, f_expanded) if f_expanded < f_reflected else (reflected, f_reflected)
+        elif f_reflected < values[-2]:
+            simplex[-1], values[-1] = reflected, f_reflected
+        else:
+            contracted = centroid + 0.5 * (simplex[-1] - centroid)
+            f_contracted = f(contracted)
+            if f_contracted < values[-1]:
+                simplex[-1], values[-1] = contracted, f_contracted
+            else:
+                # 가장 좋은 점을 향해 심플렉스를 줄임
+                simplex[1:] = simplex[0] + 0.5 * (simplex[1:] - simplex[0])
+                values[1:] = [f(point) for point in simplex[1:]]
+    return simplex, values
+
+
+def _advance_start(task):
+    start_id, simplex, values, n_iterations = task
+    if values is None:
+        values = np.array([_objective(point) for point in simplex])
+    simplex, values = nelder_mead_steps(_objective, simplex, values, n_iterations)
+    converged = values.max() - values.min() < CONVERGENCE_TOLERANCE * max(abs(values.min()), 1.0)
+    return start_id, simplex, values, converged
+
+
+def fit_light_curve(time, flux, flux_err=None, n_starts=8, max_rounds=20, seed=0, model='approximate',
+                    workers=None, progress_callback=None):
+    """
+    관측 광도 곡선에 모델을 맞춥니다.
+    무작위 시작점 n_starts개를 프로세스 풀에서 라운드 단위로 병렬 진행하고,
+    매 라운드 뒤 현재 최적값보다 확실히 나쁜 시작점은 중단합니다.
+    progress_callback(라운드, 최대 라운드, 남은 시작점 수, 현재 최적 카이제곱)은 라운드마다 호출됩니다.
+    반환값: 파라미터 이름별 값, source_flux, blend_flux, chi2를 담은 dict
+    관측 데이터가 맞춤에 맞지 않거나 (check_photometry) 모든 시작점의 카이제곱이 NaN이면 ValueError를 냅니다.
+    """
+    if model not in FIT_MODELS:
+        raise ValueError(f"맞춤에 쓸 수 없는 증폭률 모델입니다: {model} (가능한 모델: {', '.join(FIT_MODELS)})")
+    time = np.asarray(time, dtype=float)
+    flux = np.asarray(flux, dtype=float)
+    flux_err = np.ones_like(flux) if flux_err is None else np.asarray(flux_err, dtype=float)
+    check_photometry(time, flux, flux_err)
+
+    # 시작점: t0는 가장 밝은 관측 시각 근처, 나머지는 범위 안에서 무작위
+    rng = np.random.default_rng(seed)
+    lower, upper = parameter_bounds(time)
+    n_params = len(FIT_PARAMETERS)
+    peak_unit = (time[np.argmax(flux)] - lower[0]) / (upper[0] - lower[0]) if upper[0] > lower[0] else 0.5
+    alive = {}
+    for start_id in range(n_starts):
+        start = rng.uniform(0, 1, n_params)
+        start[0] = peak_unit
+        simplex = np.vstack([start, start + 0.1 * np.eye(n_params)])
+        alive[start_id] = (simplex, None)
+
+    best_chi2, best_unit = np.inf, None
+    with ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+        initializer=_init_worker, initargs=(time, flux, flux_err, model)
+    ) as executor:
+        for round_index in range(1, max_rounds + 1):
+            tasks = [(start_id, simplex, values, ITERATIONS_PER_ROUND) for start_id, (simplex, values) in alive.items()]
+            results = list(executor.map(_advance_start, tasks))
+
+            for start_id, simplex, values, converged in results:
+                alive[start_id] = (simplex, values)
+                if values.min() < best_chi2:
+                    best_chi2, best_unit = values.min(), simplex[np.argmin(values)]
+            for start_id, simplex, values, converged in results:
+                clearly_worse = round_index >= MIN_ROUNDS_BEFORE_STOP and values.min() > best_chi2 * (1 + EARLY_STOP_MARGIN)
+                if converged or clearly_worse:
+                    del alive[start_id]
+
+            if progress_callback is not None:
+                progress_callback(round_index, max_rounds, len(alive), best_chi2)
+            if not alive:
+                break
+
+    if best_unit is None:
+        raise ValueError("모든 시작점에서 카이제곱을 계산할 수 없었습니다.")
+    params = unit_to_params(best_unit, lower, upper)
+    t_scale = (time.max() - time.min()) / 6
+    source_flux, blend_flux, chi2 = fit_fluxes(model_magnification(params, time, t_scale, model), flux, 1 / flux_err**2)
+
+    result = {name: value for (name, _, _), value in zip(FIT_PARAMETERS, params)}
+    result['planet_mass_ratio'] = 10**result.pop('log10_planet_mass_ratio')
+    result.update(t_scale=t_scale, source_flux=source_flux, blend_flux=blend_flux, chi2=chi2)
+    return result
+
+
+def fitted_model_flux(fit_result, time, model='approximate'):
+    """fit_light_curve의 결과로 임의 시각의 모델 플럭스를 계산합니다."""
+    params = [
+        np.log10(fit_result['planet_mass_ratio']) if name == 'log10_planet_mass_ratio' else fit_result[name]
+        for name, _, _ in FIT_PARAMETERS
+    ]
+    magnification = model_magnification(params, np.asarray(time, dtype=float), fit_result['t_scale'], model)
+    return fit_result['source_flux'] * magnification + fit_result['blend_flux']
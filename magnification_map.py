@@ -0,0 +1,170 @@
+import os
+import functools
+import numpy as np
+
+from diagnostics import count_calls
+from disk_cache import evict_least_recently_used, touch
+
+# --- 이중 렌즈(렌즈 별 + 행성) 광선 추적 증폭 지도 ---
+# 좌표계: 렌즈 별은 원점, 행성은 +X축 위 (separation, 0)에 놓입니다.
+# 길이 단위는 렌즈 별의 아인슈타인 반경, 렌즈 별 질량 1, 행성 질량 mass_ratio.
+# 행성이 다른 각도에 있으면 광원 위치를 그 각도만큼 거꾸로 회전시켜 같은 지도를 사용합니다.
+
+MAP_CACHE_DIR = os.environ.get(
+    "MAGNIFICATION_MAP_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".magnification_maps")
+)
+MAP_HALF_WIDTH = 2.0 # 지도가 덮는 광원 평면 영역: [-2, 2] x [-2, 2] (아인슈타인 반경 단위)
+MAP_RESOLUTION = 400 # 지도 한 변의 픽셀 수
+MAP_RAYS_PER_PIXEL = 64 # 증폭률 1인 픽셀에 떨어지는 평균 광선 수 (클수록 잡음이 적음)
+# 디스크의 지도 캐시 크기 상한 (지도 하나가 약 1.3 MB). 넘으면 가장 오래 쓰지 않은 지도부터 지웁니다.
+MAP_CACHE_MAX_BYTES = int(os.environ.get("MAGNIFICATION_MAP_CACHE_MAX_BYTES", 512 << 20))
+RAY_CHUNK_SIZE = 1 << 20 # 한 번에 추적하는 광선 수 (메모리 상한)
+SOURCE_DISK_POINTS = 64 # 유한한 광원 원반을 평균할 때 사용하는 점의 수
+
+
+def shoot_rays(image_x, image_y, mass_ratio, separation):
+    """
+    이중 렌즈 방정식으로 상 평면의 광선을 광원 평면으로 보냅니다.
+    beta = z - 1 / conj(z) - q / conj(z - s)
+    """
+    z = image_x + 1j * image_y
+    with np.errstate(divide='ignore', invalid='ignore'):
+        beta = z - 1 / np.conj(z) - mass_ratio / np.conj(z - separation)
+    return beta.real, beta.imag
+
+
+def compute_magnification_map(mass_ratio, separation, resolution=MAP_RESOLUTION, half_width=MAP_HALF_WIDTH,
+                              rays_per_pixel=MAP_RAYS_PER_PIXEL, chunk_size=RAY_CHUNK_SIZE):
+    """
+    역 광선 추적(inverse ray shooting)으로 (resolution x resolution) 증폭 지도를 계산합니다.
+    상 평면의 균일한 격자 광선을 chunk_size개씩 나누어 추적하므로 메모리 사용량이 제한됩니다.
+    """
+    pixel_size = 2 * half_width / resolution
+    ray_spacing = pixel_size / np.sqrt(rays_per_pixel)
+
+    # 지도 모서리의 광원도 주 이미지가 잡히도록 상 평면 범위를 정함 (점 렌즈 이미지 위치 + 여유)
+    corner = half_width * np.sqrt(2)
+    image_half_width = (corner + np.sqrt(corner**2 + 4)) / 2 + 0.2
+    # 광선이 렌즈 중심에 정확히 떨어지지 않도록 반 칸 어긋난 격자를 사용
+    image_axis = np.arange(-image_half_width, image_half_width, ray_spacing) + ray_spacing / 2
+    rows_per_chunk = max(1, chunk_size // len(image_axis))
+
+    counts = np.zeros(resolution * resolution, dtype=np.int64)
+    for start in range(0, len(image_axis), rows_per_chunk):
+        image_y, image_x = np.meshgrid(image_axis[start:start + rows_per_chunk], image_axis, indexing='ij')
+        source_x, source_y = shoot_rays(image_x, image_y, mass_ratio, separation)
+
+        pixel_x = np.floor((source_x + half_width) / pixel_size)
+        pixel_y = np.floor((source_y + half_width) / pixel_size)
+        on_map = (pixel_x >= 0) & (pixel_x < resolution) & (pixel_y >= 0) & (pixel_y < resolution)
+        counts += np.bincount(
+            (pixel_y[on_map] * resolution + pixel_x[on_map]).astype(np.int64), minlength=resolution * resolution
+        )
+
+    # 광선 밀도 비율 = 증폭률
+    return (counts * (ray_spacing / pixel_size)**2).reshape(resolution, resolution)
+
+
+def magnification_map_path(mass_ratio, separation, resolution, half_width, rays_per_pixel, cache_dir=MAP_CACHE_DIR):
+    return os.path.join(
+        cache_dir, f"map_q{mass_ratio:.6e}_s{separation:.4f}_n{resolution}_w{half_width:g}_r{rays_per_pixel}.npy"
+    )
+
+
+@functools.lru_cache(maxsize=32)
+def load_magnification_map(mass_ratio, separation, resolution=MAP_RESOLUTION, half_width=MAP_HALF_WIDTH,
+                           rays_per_pixel=MAP_RAYS_PER_PIXEL, cache_dir=MAP_CACHE_DIR):
+    """
+    (q, s, 해상도)별 증폭 지도를 디스크에서 메모리 맵으로 읽습니다. 없으면 계산해서 저장합니다.
+    같은 프로세스에서는 열린 메모리 맵을 재사용합니다.
+    새 지도를 저장할 때마다 디스크의 지도 캐시를 MAP_CACHE_MAX_BYTES 안으로 줄입니다.
+    """
+    path = magnification_map_path(mass_ratio, separation, resolution, half_width, rays_per_pixel, cache_dir)
+    if os.path.exists(path):
+        touch(path)
+    else:
+        magnification_map = compute_magnification_map(mass_ratio, separation, resolution, half_width, rays_per_pixel)
+        os.makedirs(cache_dir, exist_ok=True)
+        # 다른 프로세스가 반쯤 쓰인 파일을 읽지 않도록 임시 파일에 쓴 뒤 이름을 바꿈
+        tmp_path = f"{path}.{os.getpid()}.tmp.npy"
+        np.save(tmp_path, magnification_map)
+        os.replace(tmp_path, path)
+        # 보간표(finite_source_table.npz)처럼 같은 디렉터리의 다른 파일은 건드리지 않도록 지도 파일만
+        evict_least_recently_used(cache_dir, "map_*.npy", MAP_CACHE_MAX_BYTES, keep=(path,))
+    return np.load(path, mmap_mode='r')
+
+
+def point_lens_magnification(u):
+    """단일 점 렌즈의 점 광원 증폭률"""
+    with np.errstate(divide='ignore'):
+        return (u**2 + 2) / (u * np.sqrt(u**2 + 4))
+
+
+def interpolate_map(magnification_map, half_width, source_x, source_y):
+    """
+    증폭 지도에서 광원 위치의 증폭률을 쌍선형 보간으로 읽습니다.
+    지도 밖의 위치는 행성의 영향이 작다고 보고 단일 렌즈 증폭률을 사용합니다.
+    """
+    resolution = magnification_map.shape[0]
+    pixel_size = 2 * half_width / resolution
+
+    # 픽셀 중심 기준의 실수 인덱스
+    fx = np.clip((source_x + half_width) / pixel_size - 0.5, 0, resolution - 1)
+    fy = np.clip((source_y + half_width) / pixel_size - 0.5, 0, resolution - 1)
+    x0 = np.minimum(fx.astype(np.intp), resolution - 2)
+    y0 = np.minimum(fy.astype(np.intp), resolution - 2)
+    tx = fx - x0
+    ty = fy - y0
+    interpolated = (
+        magnification_map[y0, x0] * (1 - tx) * (1 - ty) + magnification_map[y0, x0 + 1] * tx * (1 - ty)
+        + magnification_map[y0 + 1, x0] * (1 - tx) * ty + magnification_map[y0 + 1, x0 + 1] * tx * ty
+    )
+
+    outside = (np.abs(source_x) > half_width) | (np.abs(source_y) > half_width)
+    return np.where(outside, point_lens_magnification(np.hypot(source_x, source_y)), interpolated)
+
+
+def source_disk_offsets(n_points=SOURCE_DISK_POINTS):
+    """단위 원반 위에 고르게 퍼진 점들 (해바라기 배치). 같은 가중치로 평균하면 원반 평균이 됩니다."""
+    j = np.arange(n_points) + 0.5
+    radius = np.sqrt(j / n_points)
+    angle = j * np.pi * (3 - np.sqrt(5))
+    return radius * np.cos(angle), radius * np.sin(angle)
+
+
+@count_calls # 진단 모드에서 실행별 호출 수와 점 수를 셈
+def calculate_magnification_raytrace(u_source_x, u_source_y, u_planet_x, u_planet_y, mass_ratio, source_size):
+    """
+    광선 추적 증폭 지도를 이용한 이중 렌즈 증폭률 (calculate_magnification과 같은 인자).
+    광원 원반(반경 source_size) 위의 점들에서 지도를 읽어 평균하므로 유한 광원 효과가 포함됩니다.
+    지도는 (q, s)마다 한 번만 계산되고, 궤적이 바뀌면 보간만 다시 합니다.
+    """
+    u_source_x, u_source_y, u_planet_x, u_planet_y, mass_ratio, source_size = np.broadcast_arrays(
+        *(np.asarray(v, dtype=float) for v in (u_source_x, u_source_y, u_planet_x, u_planet_y, mass_ratio, source_size))
+    )
+
+    # 행성이 +X축에 오도록 광원 위치를 회전
+    separation = np.round(np.hypot(u_planet_x, u_planet_y), 6)
+    planet_angle = np.arctan2(u_planet_y, u_planet_x)
+    cos_angle, sin_angle = np.cos(planet_angle), np.sin(planet_angle)
+    map_x = u_source_x * cos_angle + u_source_y * sin_angle
+    map_y = -u_source_x * sin_angle + u_source_y * cos_angle
+
+    # 유한한 광원 원반 위의 점들: (..., 원반 점 수)
+    disk_x, disk_y = source_disk_offsets()
+    sample_x = map_x[..., np.newaxis] + source_size[..., np.newaxis] * disk_x
+    sample_y = map_y[..., np.newaxis] + source_size[..., np.newaxis] * disk_y
+
+    magnification = np.empty(u_source_x.shape)
+    mass_ratio_key = np.round(mass_ratio, 12)
+    pairs = np.unique(np.stack([mass_ratio_key.ravel(), separation.ravel()], axis=-1), axis=0)
+    for q, s in pairs:
+        group = (mass_ratio_key == q) & (separation == s)
+        # 행성이 없으면 (q = 0) 행성 위치와 관계없는 단일 렌즈 지도 하나를 씀.
+        # 해석식 대신 같은 광선 추적 지도를 읽어야 지도의 이산화 오차가 행성 신호처럼 보이지 않음
+        magnification_map = load_magnification_map(float(q), float(s)) if q > 0 else load_magnification_map(0.0, 0.0)
+        magnification[group] = interpolate_map(
+            magnification_map, MAP_HALF_WIDTH, sample_x[group], sample_y[group]
+        ).mean(axis=-1)
+
+    return magnification[()]
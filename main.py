@@ -1,36 +1,75 @@
 import streamlit as st
 import numpy as np
-import matplotlib.pyplot as plt
-import matplotlib.font_manager as fm 
+import plotly.graph_objects as go
+from plotly.subplots import make_subplots
 import time 
+import io
+import os
+import shutil
+import tempfile
+import threading
+import uuid
+from collections import OrderedDict, deque
+
+from lensing_core import (
+    ANIMATION_FRAME_COUNT,
+    MAGNIFICATION_MODELS,
+    adaptive_sample,
+    animation_current_points,
+    compute_animation_frames,
+    compute_einstein_radius_angle,
+    compute_planet_position,
+)
+from animation_export import export_animation
+from detection_efficiency import DETECTION_THRESHOLD, compute_detection_map
+from diagnostics import (
+    DIAGNOSTICS_TRACE_DIR,
+    PERCENTILES,
+    TRACE_EVENT_LIMIT,
+    Recorder,
+    RollingStats,
+    chrome_trace_json,
+    write_chrome_trace,
+)
+from finite_source import DEFAULT_LIMB_DARKENING, finite_source_magnification
+from lensing_plot import (
+    R_E_display,
+    FigurePool,
+    cache_background,
+    configure_korean_font,
+    create_figure,
+    create_light_curve_artists,
+    create_lensing_artists,
+    render_frame,
+    update_light_curve,
+    update_lensing_visualization,
+)
+from light_curve_fit import FIT_MODELS, fit_light_curve, fitted_model_flux, load_photometry_csv
+from photometry_lod import PHOTOMETRY_DATA_DIR, build_pyramids, open_photometry, query_pyramid, resolve_data_path
 
-# --- 폰트 설정 시작 ---
-font_path = "NanumGothic.ttf"
+# 진단 모드 (사이드바 맨 아래 체크박스): 켜져 있으면 이번 실행의 단계별 시간과 증폭률 계산 호출 수를 기록
+diagnostics_recorder = Recorder(enabled=st.session_state.get('diagnostics_enabled', False)).activate()
 
-try:
-    if not fm.findfont(fm.FontProperties(fname=font_path)):
-        st.warning(f"경고: 폰트 파일 '{font_path}'를 찾을 수 없습니다. "
-                   "시스템에 나눔고딕 폰트가 설치되어 있거나, 파일 경로가 올바른지 확인해주세요.")
-        if 'Malgun Gothic' in [f.name for f in fm.fontManager.ttflist]:
-            plt.rc('font', family='Malgun Gothic')
-        elif 'AppleGothic' in [f.name for f in fm.fontManager.ttflist]:
-            plt.rc('font', family='AppleGothic')
-        else:
-            if 'NanumGothic' in [f.name for f in fm.fontManager.ttflist]:
-                plt.rc('font', family='NanumGothic')
-            else:
-                st.error("시스템에 한글 폰트가 설치되어 있지 않아 그래프의 한글이 깨질 수 있습니다."
-                         "리눅스 사용자의 경우 'sudo apt-get install fonts-nanum' 명령으로 폰트를 설치해주세요.")
-                plt.rc('font', family='DejaVu Sans')
-    else:
-        fm.fontManager.addfont(font_path)
-        plt.rc('font', family='NanumGothic')
-    
-    plt.rcParams['axes.unicode_minus'] = False
-except Exception as e:
-    st.error(f"폰트 설정 중 오류가 발생했습니다: {e}. 기본 폰트로 표시됩니다.")
-    plt.rc('font', family='DejaVu Sans')
-    plt.rcParams['axes.unicode_minus'] = False
+# --- 폰트 설정 시작 ---
+@st.cache_resource
+def setup_korean_font():
+    """
+    한글 폰트 찾기와 등록은 프로세스마다 한 번만 합니다 (matplotlib 폰트 설정은 모든 세션이 공유).
+    반환값: (설정한 폰트 이름 또는 None, 오류 메시지 또는 None)
+    """
+    try:
+        return configure_korean_font(), None
+    except Exception as e:
+        return None, str(e)
+
+
+with diagnostics_recorder.span('폰트 설정'):
+    korean_font_family, font_error = setup_korean_font()
+if font_error is not None:
+    st.error(f"폰트 설정 중 오류가 발생했습니다: {font_error}. 기본 폰트로 표시됩니다.")
+elif korean_font_family is None:
+    st.error("시스템에 한글 폰트가 설치되어 있지 않아 그래프의 한글이 깨질 수 있습니다."
+             "리눅스 사용자의 경우 'sudo apt-get install fonts-nanum' 명령으로 폰트를 설치해주세요.")
 # --- 폰트 설정 끝 ---
 
 
@@ -97,75 +136,142 @@ planet_orbital_period_factor = st.sidebar.slider(
     help="행성이 렌즈 별 주위를 한 바퀴 도는 데 걸리는 시간. 값이 작을수록 빠르게 움직입니다."
 )
 
+# 사이드바 "증폭률 계산 모델" 이름 → lensing_core.MAGNIFICATION_MODELS의 모델 이름
+MAGNIFICATION_MODEL_LABELS = {
+    "단순 근사": 'approximate',
+    "이중 렌즈 광선 추적 지도": 'raytrace',
+    "이중 렌즈 정확해 (점 광원)": 'polynomial',
+}
+magnification_model_label = st.sidebar.selectbox(
+    "증폭률 계산 모델",
+    list(MAGNIFICATION_MODEL_LABELS),
+    help="단순 근사: 행성 근처의 범프/딥을 흉내 낸 근사식. "
+         "이중 렌즈 광선 추적 지도: 렌즈 별과 행성의 렌즈 방정식으로 계산한 증폭 지도 (첫 계산에 몇 초 걸립니다). "
+         "이중 렌즈 정확해: 렌즈 방정식의 5차 다항식을 풀어 구한 점 광원 증폭률 (광원 크기는 반영되지 않습니다)."
+)
+magnification_model = MAGNIFICATION_MODEL_LABELS[magnification_model_label]
+adaptive_sampling = st.sidebar.checkbox(
+    "적응형 밝기 곡선 샘플링",
+    value=False,
+    help="피크와 행성 신호 근처는 촘촘하게, 평평한 구간은 성기게 샘플링합니다. 좁은 행성 신호가 더 선명해집니다."
+)
+
 # --- 애니메이션 제어 슬라이더 ---
+if 'animating' not in st.session_state:
+    st.session_state.animating = False
+# 재생이 끝난 지점을 진행 슬라이더에 반영 (위젯을 만들기 전에만 값을 바꿀 수 있음)
+if 'animation_progress_pending' in st.session_state:
+    st.session_state.animation_progress = st.session_state.pop('animation_progress_pending')
+st.session_state.setdefault('animation_progress', 0)
+
+
+def toggle_animation():
+    """시작/정지 버튼: 정지하면 재생하던 프레임을 진행 슬라이더에 남겨, 다음 시작이 그 지점부터 이어집니다."""
+    clock = st.session_state.get('animation_clock')
+    if st.session_state.animating and clock is not None:
+        st.session_state.animation_progress = clock['last_frame']
+    st.session_state.animating = not st.session_state.animating
+    st.session_state.animation_clock = None
+
+
 animation_progress = st.sidebar.slider(
     "시뮬레이션 시간 진행",
-    min_value=0, max_value=100, value=0, step=1,
+    min_value=0, max_value=100, step=1, key='animation_progress',
     help="렌즈 시스템의 배경 별 통과 시간 진행도를 조절합니다."
 )
-animate_button = st.sidebar.button("애니메이션 시작/정지")
-
-if 'animating' not in st.session_state:
-    st.session_state.animating = False
+st.sidebar.button("애니메이션 시작/정지", on_click=toggle_animation)
+animation_fps = st.sidebar.slider(
+    "애니메이션 목표 프레임 속도 (fps)",
+    min_value=5, max_value=30, value=20, step=1,
+    help="프레임 처리가 늦어지면 프레임을 건너뛰어 전체 재생 시간을 유지합니다."
+)
+client_side_animation = st.sidebar.checkbox(
+    "브라우저에서 애니메이션 재생",
+    value=False,
+    help="모든 프레임을 한 번에 브라우저로 보내, 프레임마다 서버를 거치지 않고 재생합니다."
+)
 
 
 # --- 2. 물리 상수 및 기본 설정 ---
-G = 6.67430e-11  # 중력 상수 (m^3 kg^-1 s^-2)
-c = 2.99792458e8 # 빛의 속도 (m/s)
-M_sun = 1.989e30 # 태양 질량 (kg)
-PC_TO_METER = 3.0857e16 # 1 파섹(pc) = 3.0857e16 미터
+# 아인슈타인 반경은 물리량으로만 사용하고 시각화에서 제거
+with diagnostics_recorder.span('물리 설정'):
+    einstein_radius_angle = compute_einstein_radius_angle(lens_mass_solar, observer_lens_distance_kpc)
 
-D_L = observer_lens_distance_kpc * 1000 * PC_TO_METER 
-D_S = D_L + (500 * PC_TO_METER) 
-D_LS = D_S - D_L
 
-M_lens = lens_mass_solar * M_sun
+# --- 밝기 곡선 캐시 (모든 세션이 공유) ---
+# 사이드바 슬라이더의 step과 동일한 값. 캐시 키를 만들 때 파라미터를 이 간격으로 양자화합니다.
+SLIDER_STEPS = {
+    'planet_initial_angle_deg': 10,
+    'lens_mass_solar': 0.1,
+    'source_radius_ratio': 0.001,
+    'planet_mass_ratio': 1e-6,
+    'planet_separation_from_lens': 0.05,
+    'relative_velocity_factor': 0.1,
+    'observer_lens_distance_kpc': 0.1,
+    'u_lens_y_impact_parameter': 0.01,
+    'planet_orbital_period_factor': 0.1,
+    'animation_progress': 1,
+}
 
-# 아인슈타인 반경은 물리량으로만 사용하고 시각화에서 제거
-einstein_radius_angle = np.sqrt(4 * G * M_lens / (c**2) * D_LS / (D_L * D_S))
+# 캐시 메모리 상한 (MB), 환경 변수로 조정 가능
+LIGHT_CURVE_CACHE_MAX_MB = float(os.environ.get("LIGHT_CURVE_CACHE_MAX_MB", "256"))
 
-R_E_display = 40 # 시각화 스케일 팩터
 
+def quantize_params(kind, **params):
+    """캐시 키: 계산 종류와, 슬라이더 step 단위로 양자화된 파라미터의 튜플"""
+    return (kind,) + tuple((name, int(round(value / SLIDER_STEPS[name]))) for name, value in sorted(params.items()))
 
-# --- 3. 중력 렌즈 광도 증폭 계산 함수 ---
-def calculate_magnification(u_source_x, u_source_y, u_planet_x, u_planet_y, mass_ratio, source_size):
+
+class LightCurveCache:
     """
-    미세 중력 렌즈 광도 증폭률 계산 (단순화된 근사)
-    u_source_x, u_source_y: 배경 별의 렌즈 중심으로부터의 상대적 X, Y 위치 (아인슈타인 반경 단위)
-    u_planet_x, u_planet_y: 행성의 렌즈 별로부터의 X, Y 위치 (아인슈타인 반경 단위)
+    계산된 밝기 곡선(NumPy 배열 또는 배열의 튜플)을 저장하는 LRU 캐시.
+    저장된 배열의 총 바이트가 max_bytes를 넘으면 가장 오래 사용되지 않은 항목부터 버립니다.
+    여러 세션(스레드)이 동시에 사용하므로 잠금으로 보호합니다.
     """
-    
-    # 주 렌즈(렌즈 별)에 의한 증폭
-    u_main = np.sqrt(u_source_x**2 + u_source_y**2) 
-    
-    if u_main < 1e-6: # 거의 중심에 가까울 때 (특이점 방지)
-        if source_size > 0:
-            # 유한한 광원 크기를 고려한 중심 증폭률
-            mag_main = (u_main**2 + 2) / (np.sqrt(u_main**2 + 4) * source_size)
-        else:
-            mag_main = 1e6 # 무한대 (점 광원 가정 시)
-    else:
-        mag_main = (u_main**2 + 2) / (u_main * np.sqrt(u_main**2 + 4))
 
-    if mag_main > 1e4:
-        mag_main = 1e4
-    
-    magnification = mag_main
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.current_bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
 
-    # 행성에 의한 추가 증폭/감폭 효과 (근접 근사)
-    dist_to_planet = np.sqrt((u_source_x - u_planet_x)**2 + (u_source_y - u_planet_y)**2)
-    
-    if dist_to_planet < 0.1 + source_size + (mass_ratio * 10): 
-        # 행성 근처에서 발생하는 추가 증폭 (범프)
-        additional_mag = (mass_ratio / (dist_to_planet**2 + 0.001)) * 50 
-        magnification += additional_mag
-        
-        # 행성 그림자를 통과할 때의 감폭 효과 (딥)
-        if dist_to_planet < source_size * 0.5:
-             magnification *= (1 - mass_ratio * 500) 
-             if magnification < 1.0: magnification = 1.0 
+    def __len__(self):
+        return len(self._entries)
 
-    return magnification
+    def get_or_compute(self, key, compute):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][0]
+            self.misses += 1
+
+        # 계산은 잠금 밖에서 수행 (다른 세션의 캐시 적중을 막지 않도록)
+        value = compute()
+        arrays = value if isinstance(value, tuple) else (value,)
+        for array in arrays:
+            array.setflags(write=False) # 세션 간에 공유되므로 읽기 전용
+        nbytes = sum(array.nbytes for array in arrays)
+
+        with self._lock:
+            if key not in self._entries and nbytes <= self.max_bytes:
+                self._entries[key] = (value, nbytes)
+                self.current_bytes += nbytes
+                while self.current_bytes > self.max_bytes:
+                    _, (_, evicted_nbytes) = self._entries.popitem(last=False)
+                    self.current_bytes -= evicted_nbytes
+        return value
+
+
+@st.cache_resource
+def get_light_curve_cache():
+    """프로세스 전체에서 하나만 만들어 모든 세션이 공유하는 밝기 곡선 캐시"""
+    return LightCurveCache(max_bytes=int(LIGHT_CURVE_CACHE_MAX_MB * 1024 * 1024))
+
+
+light_curve_cache = get_light_curve_cache()
 
 
 # --- 4. 중력 렌즈 시스템 시각화 ---
@@ -174,66 +280,132 @@ st.subheader("시스템 시각화")
 visualization_placeholder = st.empty()
 
 
-def update_lensing_visualization(current_lens_x_display, current_lens_y_display, current_planet_x_relative, current_planet_y_relative, ax_obj):
+def build_client_side_animation(u_values_x, lens_x_ratio_frames, current_mag_frames, lens_y_display, planet_x_frames,
+                                planet_y_frames, magnifications_frames, source_display_radius, frame_duration_ms=50):
     """
-    현재 렌즈 별의 위치와 행성 위치에 따라 시스템 시각화를 업데이트합니다.
-    (배경별은 고정된 위치에 있고, 렌즈 시스템이 X축을 따라 움직입니다.)
+    모든 프레임을 담은 Plotly 애니메이션을 만듭니다.
+    브라우저로 한 번만 전송되며, 재생은 서버 왕복 없이 클라이언트에서 이루어집니다.
     """
-    ax_obj.clear() 
-    ax_obj.set_facecolor('black')
-    ax_obj.set_xlim(-100, 100)
-    ax_obj.set_ylim(-100, 100)
-    ax_obj.set_aspect('equal')
-    ax_obj.axis('off')
-
-    # 배경 별 (광원) 고정 그리기
-    # 배경 별은 화면 중앙 (0,0)에 완전히 고정됩니다.
-    source_display_x_fixed = 0 
-    source_display_y_fixed = 0 
-    source_display_radius = source_radius_ratio * R_E_display * 5 
-    ax_obj.add_artist(plt.Circle((source_display_x_fixed, source_display_y_fixed), source_display_radius, color='orange', zorder=4)) 
-    ax_obj.text(source_display_x_fixed, source_display_y_fixed - 15, '배경 별 (광원)', color='white', ha='center', fontsize=10)
-
-    # 렌즈 별 그리기 (동적으로 움직임)
-    lens_display_x = current_lens_x_display
-    lens_display_y = current_lens_y_display
-    ax_obj.add_artist(plt.Circle((lens_display_x, lens_display_y), 10, color='yellow', zorder=5))
-    ax_obj.text(lens_display_x, lens_display_y - 15, '렌즈 별', color='white', ha='center', fontsize=10)
-
-    # 외계 행성 그리기 (렌즈 별을 기준으로 공전)
-    # 행성의 위치는 렌즈 별의 위치에 상대적으로 더해집니다.
-    planet_abs_display_x = lens_display_x + (current_planet_x_relative * R_E_display) 
-    planet_abs_display_y = lens_display_y + (current_planet_y_relative * R_E_display) 
-    ax_obj.add_artist(plt.Circle((planet_abs_display_x, planet_abs_display_y), 4, color='gray', zorder=6))
-    ax_obj.text(planet_abs_display_x, planet_abs_display_y + 10, '외계 행성', color='white', ha='center', fontsize=10)
-
-    # 빛의 경로 (개념적, 렌즈를 향해 휘어지는 이미지)
-    # 고정된 배경 별에서 렌즈 별로 향하는 빛의 경로를 개념적으로 표현
-    ax_obj.plot([source_display_x_fixed, lens_display_x], 
-                 [source_display_y_fixed, lens_display_y], 
-                 color='purple', linestyle='-', linewidth=1, alpha=0.7)
-
-
-# 초기 시각화 그림 생성
-fig_lensing, ax_lensing = plt.subplots(figsize=(8, 5))
-
-# 초기 행성 위치 계산 (렌즈 별을 기준으로)
-initial_planet_angle_rad = np.deg2rad(planet_initial_angle_deg)
-initial_planet_x_relative = planet_separation_from_lens * np.cos(initial_planet_angle_rad)
-initial_planet_y_relative = planet_separation_from_lens * np.sin(initial_planet_angle_rad)
-
-# 렌즈 시스템의 초기 X 위치 (밝기 곡선 시작점)
-# 화면에 표시되는 렌즈의 X 위치를 설정합니다.
-initial_lens_x_display = -3.0 * relative_velocity_factor * R_E_display 
+    lens_x_frames = lens_x_ratio_frames * R_E_display
+    planet_abs_x_frames = lens_x_frames + planet_x_frames * R_E_display
+    planet_abs_y_frames = lens_y_display + planet_y_frames * R_E_display
+
+    def frame_traces(i):
+        return [
+            go.Scatter(x=[0, lens_x_frames[i]], y=[0, lens_y_display]),
+            go.Scatter(x=[lens_x_frames[i]], y=[lens_y_display]),
+            go.Scatter(x=[planet_abs_x_frames[i]], y=[planet_abs_y_frames[i]]),
+            go.Scatter(x=u_values_x, y=magnifications_frames[i]),
+            go.Scatter(x=[lens_x_ratio_frames[i]], y=[current_mag_frames[i]]),
+        ]
+
+    fig = make_subplots(rows=2, cols=1, row_heights=[0.55, 0.45], vertical_spacing=0.08,
+                        subplot_titles=("시스템 시각화", "배경 별 밝기 변화 (광도 증폭률)"))
+    initial = frame_traces(0)
+
+    # 배경 별 (광원) 고정
+    fig.add_trace(go.Scatter(x=[0], y=[0], mode='markers+text', text=['배경 별 (광원)'], textposition='bottom center',
+                             marker=dict(color='orange', size=max(2 * source_display_radius, 4)),
+                             textfont=dict(color='white'), showlegend=False, hoverinfo='skip'), row=1, col=1)
+    # 빛의 경로, 렌즈 별, 외계 행성 (프레임마다 갱신)
+    fig.add_trace(initial[0].update(mode='lines', line=dict(color='purple', width=1), opacity=0.7,
+                                    showlegend=False, hoverinfo='skip'), row=1, col=1)
+    fig.add_trace(initial[1].update(mode='markers+text', text=['렌즈 별'], textposition='bottom center',
+                                    marker=dict(color='yellow', size=20), textfont=dict(color='white'),
+                                    showlegend=False, hoverinfo='skip'), row=1, col=1)
+    fig.add_trace(initial[2].update(mode='markers+text', text=['외계 행성'], textposition='top center',
+                                    marker=dict(color='gray', size=8), textfont=dict(color='white'),
+                                    showlegend=False, hoverinfo='skip'), row=1, col=1)
+    # 밝기 곡선과 현재 지점 (프레임마다 갱신)
+    fig.add_trace(initial[3].update(mode='lines', line=dict(color='blue', width=2), showlegend=False), row=2, col=1)
+    fig.add_trace(initial[4].update(mode='markers', marker=dict(color='red', size=10),
+                                    name='현재 렌즈 시스템 위치'), row=2, col=1)
+
+    fig.frames = [go.Frame(data=frame_traces(i), traces=[1, 2, 3, 4, 5], name=str(i))
+                  for i in range(len(lens_x_ratio_frames))]
+
+    fig.add_shape(type='rect', x0=-100, x1=100, y0=-100, y1=100, fillcolor='black', line_width=0, layer='below',
+                  row=1, col=1)
+    fig.update_xaxes(range=[-100, 100], visible=False, row=1, col=1)
+    fig.update_yaxes(range=[-100, 100], visible=False, scaleanchor='x', row=1, col=1)
+    magnification_min = magnifications_frames.min()
+    magnification_max = magnifications_frames.max()
+    fig.update_xaxes(title_text="렌즈 시스템 상대 X거리 (아인슈타인 반경의 배수)", row=2, col=1)
+    fig.update_yaxes(title_text="광도 증폭률", range=[1.0, magnification_max + 0.05 * (magnification_max - magnification_min)],
+                     row=2, col=1)
+
+    play_args = {"frame": {"duration": frame_duration_ms, "redraw": False}, "fromcurrent": True,
+                 "transition": {"duration": 0}}
+    pause_args = {"frame": {"duration": 0, "redraw": False}, "mode": "immediate", "transition": {"duration": 0}}
+    fig.update_layout(
+        height=900,
+        updatemenus=[dict(type='buttons', direction='left', x=0, y=-0.05, xanchor='left', yanchor='top', buttons=[
+            dict(label='▶ 재생', method='animate', args=[None, play_args]),
+            dict(label='⏸ 정지', method='animate', args=[[None], pause_args]),
+        ])],
+        sliders=[dict(currentvalue=dict(prefix="시뮬레이션 시간 진행: "), pad=dict(t=50), steps=[
+            dict(label=str(i), method='animate', args=[[str(i)], pause_args]) for i in range(len(lens_x_ratio_frames))
+        ])],
+    )
+    return fig
+
+
+def record_diagnostics(recorder, label, stage_prefix=''):
+    """한 번의 실행(또는 프레임)의 기록을 세션의 단계별 통계와 트레이스에 더합니다."""
+    if not recorder.enabled:
+        return
+    st.session_state.setdefault('diagnostics_stats', RollingStats()).add_recorder(recorder, stage_prefix)
+    trace = st.session_state.setdefault('diagnostics_trace', deque(maxlen=TRACE_EVENT_LIMIT))
+    trace.extend(recorder.trace_events(label))
+    if DIAGNOSTICS_TRACE_DIR and label == 'rerun':
+        # 세션마다 파일 하나를 실행이 끝날 때마다 (지금까지의 애니메이션 프레임까지 포함해) 갱신
+        session_trace_id = st.session_state.setdefault('diagnostics_trace_id', uuid.uuid4().hex[:12])
+        write_chrome_trace(os.path.join(DIAGNOSTICS_TRACE_DIR, f"trace_{session_trace_id}.json"), trace)
+
+
+def draw_and_show(placeholder, fig, background, artists, recorder=diagnostics_recorder):
+    """움직이는 아티스트를 그린 프레임을 placeholder에 이미지로 보냅니다. 그리기와 PNG 변환 시간을 따로 기록합니다."""
+    with recorder.span('그림 그리기'):
+        frame = render_frame(fig, background, artists)
+    with recorder.span('PNG 변환'):
+        # st.pyplot과 같이 열 너비에 맞춰 늘려 보여줌 (DISPLAY_DPI로 그려 늘려도 흐리지 않음)
+        placeholder.image(frame, width='stretch')
+
+
+# 이 세션의 그림들: Figure는 세션마다 한 번만 만들어 다시 씁니다.
+figure_pool = st.session_state.setdefault('figure_pool', FigurePool())
+
+
+def build_lensing_figure():
+    fig, ax = figure_pool.axes('lensing', (8, 5))
+    artists = create_lensing_artists(ax, source_radius_ratio * R_E_display * 5)
+    return fig, artists, cache_background(fig)
+
+
+# 초기 시각화 그림 (아티스트와 정적인 배경은 배경 별 크기가 바뀔 때만 새로 만듭니다)
+with diagnostics_recorder.span('그림 그리기'):
+    fig_lensing, lensing_artists, lensing_background = figure_pool.prepared(
+        'lensing', source_radius_ratio, build_lensing_figure
+    )
+
+with diagnostics_recorder.span('물리 설정'):
+    # 초기 행성 위치 계산 (렌즈 별을 기준으로)
+    initial_planet_x_relative, initial_planet_y_relative = compute_planet_position(
+        planet_initial_angle_deg, 0, planet_orbital_period_factor, planet_separation_from_lens
+    )
+
+    # 렌즈 시스템의 초기 X 위치 (밝기 곡선 시작점)
+    # 화면에 표시되는 렌즈의 X 위치를 설정합니다.
+    initial_lens_x_display = -3.0 * relative_velocity_factor * R_E_display 
 
 update_lensing_visualization(
     initial_lens_x_display,         # 렌즈 별의 X 화면 위치 (시뮬레이션 시작점)
     u_lens_y_impact_parameter * R_E_display, # 렌즈 별의 Y 화면 위치 (충격 인자)
     initial_planet_x_relative,      # 행성의 렌즈 별 기준 상대 X 위치
     initial_planet_y_relative,      # 행성의 렌즈 별 기준 상대 Y 위치
-    ax_lensing
+    lensing_artists
 ) 
-visualization_placeholder.pyplot(fig_lensing)
+draw_and_show(visualization_placeholder, fig_lensing, lensing_background, lensing_artists.values())
 
 
 # --- 5. 밝기 변화 곡선 ---
@@ -245,88 +417,242 @@ u_min_curve = -3.0 * relative_velocity_factor
 u_max_curve = 3.0 * relative_velocity_factor
 u_values_x_curve = np.linspace(u_min_curve, u_max_curve, 300) 
 
-fig_light_curve, ax_light_curve = plt.subplots(figsize=(8, 4))
 light_curve_placeholder = st.empty()
 
+# --- 대용량 관측 데이터 겹쳐 보기 ---
+with st.expander("관측 데이터 겹쳐 보기 (대용량 CSV)"):
+    st.write("시간, 플럭스 열로 된 CSV (시간 오름차순)를 밝기 곡선 위에 겹쳐 그립니다. 관측 기간 전체를 밝기 곡선의 X 범위에 맞추고, "
+             "플럭스는 기준 플럭스로 나누어 증폭률로 봅니다. 수백만 행도 디스크에서 나누어 읽고, 화면의 픽셀마다 최솟값/최댓값만 그립니다.")
+    overlay_file = st.file_uploader("겹쳐 볼 관측 데이터 (CSV)", type=['csv'])
+    # 서버 파일은 운영자가 PHOTOMETRY_DATA_DIR로 열어 둔 디렉터리 안에서만 읽음
+    overlay_path = (st.text_input("또는 서버 데이터 디렉터리 안의 CSV 파일 (상대 경로)")
+                    if PHOTOMETRY_DATA_DIR else None)
+    overlay_baseline = st.number_input("기준 플럭스 (증폭률 1에 해당)", min_value=1e-12, value=1.0, format="%g")
+    overlay_x_range = st.slider("표시할 X 범위 (확대)", min_value=u_min_curve, max_value=u_max_curve,
+                                value=(u_min_curve, u_max_curve), step=0.01)
+    residual_placeholder = st.empty()
+
+observation = None
+try:
+    with st.spinner("관측 데이터를 변환하는 중..."), diagnostics_recorder.span('관측 데이터 읽기'):
+        if overlay_file is not None:
+            observation = open_photometry(overlay_file)
+        elif overlay_path:
+            observation = open_photometry(resolve_data_path(overlay_path))
+except (OSError, ValueError) as e:
+    st.error(f"관측 데이터를 읽을 수 없습니다: {e}")
+if observation is not None and len(observation) < 2:
+    observation = None
+
+
+def observation_x_of_time(observation_time):
+    """관측 시각을 밝기 곡선의 X 위치로 (관측 기간 전체 -> [u_min_curve, u_max_curve])"""
+    t_first, t_last = observation[0, 0], observation[-1, 0]
+    return u_min_curve + (observation_time - t_first) / (t_last - t_first) * (u_max_curve - u_min_curve)
 
-# --- 애니메이션 루프 ---
-if animate_button:
-    st.session_state.animating = not st.session_state.animating 
 
+def observation_time_of_x(x):
+    t_first, t_last = observation[0, 0], observation[-1, 0]
+    return t_first + (np.asarray(x) - u_min_curve) / (u_max_curve - u_min_curve) * (t_last - t_first)
+
+
+def get_observation_pyramids(residual_key=None, magnifications_of_x=None):
+    """
+    관측 데이터(와 모델 대비 잔차)의 최소/최대 피라미드를 한 번의 스트리밍 패스로 만들고 세션에 보관합니다.
+    잔차가 필요 없으면 같은 데이터/기준 플럭스로 만든 기존 피라미드를 그대로 씁니다.
+    """
+    data_key = (observation.filename, overlay_baseline, u_min_curve, u_max_curve)
+    cached_key, pyramids = st.session_state.get('observation_pyramids', (None, None))
+    if cached_key is not None and cached_key[0] == data_key and (residual_key is None or cached_key[1] == residual_key):
+        return pyramids
+
+    transforms = {'data': lambda t, flux: flux / overlay_baseline}
+    if magnifications_of_x is not None:
+        transforms['residual'] = lambda t, flux: flux / overlay_baseline - magnifications_of_x(observation_x_of_time(t))
+    with diagnostics_recorder.span('관측 데이터 축소'):
+        pyramids = build_pyramids(observation[:, 0], observation[:, 1], transforms)
+    st.session_state.observation_pyramids = ((data_key, residual_key), pyramids)
+    return pyramids
+
+
+def draw_observation_overlay(ax_obj, pyramids):
+    """보이는 X 범위만 픽셀 폭에 맞춰 축소한 관측 데이터를 정적인 배경으로 그립니다."""
+    n_pixels = max(int(ax_obj.get_window_extent().width), 1)
+    rows = query_pyramid(pyramids['data'], observation[:, 0], *observation_time_of_x(overlay_x_range), n_pixels)
+    ax_obj.plot(observation_x_of_time(observation[rows, 0]), observation[rows, 1] / overlay_baseline,
+                color='gray', linewidth=0.8, alpha=0.7, label='관측 데이터')
+
+
+def prepare_light_curve_figure(curve_key, u_values_x, magnifications_curve, observation_pyramids, magnification_top=None):
+    """
+    밝기 곡선 Figure의 아티스트와 정적인 배경 (관측 데이터 포함).
+    곡선(curve_key), 관측 데이터, 표시 범위가 지난 실행과 같으면 다시 그리지 않고 그대로 씁니다.
+    """
+    def build():
+        fig, ax = figure_pool.axes('light_curve', (8, 4))
+        if observation_pyramids is not None:
+            draw_observation_overlay(ax, observation_pyramids)
+        artists = create_light_curve_artists(ax, u_values_x, magnifications_curve, magnification_top=magnification_top)
+        ax.set_xlim(overlay_x_range)
+        return fig, artists, cache_background(fig)
+
+    observation_key = None if observation_pyramids is None else (observation.filename, overlay_baseline)
+    return figure_pool.prepared('light_curve', (curve_key, observation_key, overlay_x_range), build)
+
+
+def schedule_animation_frame(clock, now, frames_per_second, n_frames):
+    """
+    재생 시작 이후 흐른 시간으로 지금 보여야 할 프레임 번호를 정합니다 (마감 시각 기준).
+    프레임 처리가 늦어지면 밀린 프레임을 건너뛰어 전체 재생 시간을 유지합니다.
+    """
+    deadline_frame = clock['start_frame'] + int((now - clock['start_time']) * frames_per_second)
+    frame = min(max(deadline_frame, clock['last_frame']), n_frames - 1)
+    clock['skipped'] += max(frame - clock['last_frame'] - 1, 0)
+    clock['last_frame'] = frame
+    return frame
+
+
+# --- 애니메이션 루프 ---
 if st.session_state.get('animating', False):
     st.write("애니메이션 실행 중... 🌟") 
     progress_bar = st.progress(0)
-    for i in range(101):
-        # 렌즈 시스템의 현재 X 위치 (시뮬레이션 진행도에 따라)
-        current_lens_x_ratio = u_values_x_curve[int(i / 100 * (len(u_values_x_curve) - 1))]
-        current_lens_x_display = current_lens_x_ratio * R_E_display
-        current_lens_y_display = u_lens_y_impact_parameter * R_E_display
-        
-        # 행성의 렌즈 별 기준 공전 위치
-        current_planet_angle_rad = np.deg2rad(planet_initial_angle_deg + (i / 100) * 360 / planet_orbital_period_factor)
-        current_planet_x_relative = planet_separation_from_lens * np.cos(current_planet_angle_rad)
-        current_planet_y_relative = planet_separation_from_lens * np.sin(current_planet_angle_rad)
-
-        update_lensing_visualization(
-            current_lens_x_display, 
-            current_lens_y_display,
-            current_planet_x_relative, 
-            current_planet_y_relative, 
-            ax_lensing
-        )
-        visualization_placeholder.pyplot(fig_lensing)
-
-        ax_light_curve.clear()
-        
-        magnifications_curve_animated = []
-        for idx, lens_x_ratio_for_curve in enumerate(u_values_x_curve):
-            # 밝기 곡선을 그릴 때 행성 위치는 해당 시뮬레이션 프레임의 행성 위치를 사용
-            temp_planet_angle_rad = np.deg2rad(planet_initial_angle_deg + (i / 100) * 360 / planet_orbital_period_factor)
-            temp_planet_x_relative = planet_separation_from_lens * np.cos(temp_planet_angle_rad)
-            temp_planet_y_relative = planet_separation_from_lens * np.sin(temp_planet_angle_rad)
-
-            # calculate_magnification 함수에서 u_source_x, u_source_y는 
-            # '배경 별의 렌즈 중심으로부터의 상대적 위치'이므로,
-            # 렌즈 별이 움직이는 효과를 주기 위해 (0,0)에 고정된 배경 별에 대해 
-            # 렌즈 별의 현재 X/Y 위치를 반전하여 넣어줍니다.
-            mag = calculate_magnification(
-                u_source_x=-lens_x_ratio_for_curve, # 렌즈가 +X로 가면 배경별은 렌즈에 대해 -X로 보임
-                u_source_y=-u_lens_y_impact_parameter, # 렌즈가 +Y로 가면 배경별은 렌즈에 대해 -Y로 보임
-                u_planet_x=temp_planet_x_relative,
-                u_planet_y=temp_planet_y_relative,
-                mass_ratio=planet_mass_ratio,
-                source_size=source_radius_ratio
+
+    # 애니메이션 전체 프레임을 재생 전에 한 번만 계산 (같은 파라미터는 모든 세션에서 재사용)
+    animation_key = quantize_params(
+        ('animation', magnification_model, adaptive_sampling),
+        relative_velocity_factor=relative_velocity_factor,
+        u_lens_y_impact_parameter=u_lens_y_impact_parameter,
+        planet_initial_angle_deg=planet_initial_angle_deg,
+        planet_orbital_period_factor=planet_orbital_period_factor,
+        planet_separation_from_lens=planet_separation_from_lens,
+        planet_mass_ratio=planet_mass_ratio,
+        source_radius_ratio=source_radius_ratio
+    )
+    with diagnostics_recorder.span('증폭률 계산'):
+        planet_x_frames, planet_y_frames, magnifications_frames, u_values_x_sampled = light_curve_cache.get_or_compute(
+            animation_key,
+            lambda: compute_animation_frames(
+                u_values_x_curve,
+                u_lens_y_impact_parameter,
+                planet_initial_angle_deg,
+                planet_orbital_period_factor,
+                planet_separation_from_lens,
+                planet_mass_ratio,
+                source_radius_ratio,
+                magnification_fn=MAGNIFICATION_MODELS[magnification_model],
+                adaptive=adaptive_sampling
             )
-            magnifications_curve_animated.append(mag)
-
-        ax_light_curve.plot(u_values_x_curve, magnifications_curve_animated, color='blue', linewidth=2)
-        
-        ax_light_curve.set_title("배경 별 밝기 변화 (광도 증폭률)")
-        ax_light_curve.set_xlabel(f"렌즈 시스템 상대 X거리 (아인슈타인 반경의 배수)")
-        ax_light_curve.set_ylabel("광도 증폭률")
-        ax_light_curve.grid(True)
-        ax_light_curve.set_ylim(bottom=1.0)
-        
-        # 현재 애니메이션 지점 표시
-        current_mag_at_animation_point = calculate_magnification(
-            u_source_x=-current_lens_x_ratio, # 현재 렌즈의 위치에 대한 배경별의 상대 위치
-            u_source_y=-u_lens_y_impact_parameter,
-            u_planet_x=current_planet_x_relative, 
-            u_planet_y=current_planet_y_relative, 
-            mass_ratio=planet_mass_ratio,
-            source_size=source_radius_ratio
         )
-        ax_light_curve.plot([current_lens_x_ratio], 
-                            [current_mag_at_animation_point], 
-                            'ro', markersize=8, label='현재 렌즈 시스템 위치')
-        ax_light_curve.legend()
-        light_curve_placeholder.pyplot(fig_light_curve)
+    # 렌즈 시스템의 프레임별 X 위치 (시뮬레이션 진행도에 따라)와 그 지점의 증폭률
+    lens_x_ratio_frames, current_mag_frames = animation_current_points(
+        u_values_x_curve, u_values_x_sampled, magnifications_frames
+    )
+    current_lens_y_display = u_lens_y_impact_parameter * R_E_display
 
-        progress_bar.progress(i)
-        time.sleep(0.05) 
+    if client_side_animation:
+        # 모든 프레임을 한 번에 브라우저로 보내고, 재생은 클라이언트에서 처리
+        light_curve_placeholder.empty()
+        with diagnostics_recorder.span('Plotly 애니메이션 만들기'):
+            visualization_placeholder.plotly_chart(build_client_side_animation(
+                u_values_x_sampled,
+                lens_x_ratio_frames,
+                current_mag_frames,
+                current_lens_y_display,
+                planet_x_frames,
+                planet_y_frames,
+                magnifications_frames,
+                source_radius_ratio * R_E_display * 5
+            ))
+        progress_bar.progress(100)
+        st.session_state.animating = False
+    else:
+        # 전체 프레임 중 최댓값으로 Y축 상한을 고정하고, 정적인 배경은 한 번만 그림
+        magnification_min = magnifications_frames.min()
+        magnification_max = magnifications_frames.max()
+        observation_pyramids = get_observation_pyramids() if observation is not None else None
+        with diagnostics_recorder.span('그림 그리기'):
+            fig_light_curve, light_curve_artists, light_curve_background = prepare_light_curve_figure(
+                animation_key,
+                u_values_x_sampled,
+                magnifications_frames[0],
+                observation_pyramids,
+                magnification_top=magnification_max + 0.05 * (magnification_max - magnification_min)
+            )
 
-    st.session_state.animating = False 
-    st.experimental_rerun() 
+        # 재생 시계: 처음 시작하거나 진행 슬라이더를 옮겼으면 슬라이더 위치부터,
+        # 재생 중에 다른 파라미터가 바뀌어 다시 실행된 것이면 보던 프레임부터 이어서 재생
+        previous_clock = st.session_state.get('animation_clock')
+        if previous_clock is None or previous_clock['slider_value'] != animation_progress:
+            start_frame = 0 if animation_progress >= ANIMATION_FRAME_COUNT - 1 else animation_progress
+        else:
+            start_frame = previous_clock['last_frame']
+        st.session_state.animation_clock = {
+            'start_time': time.perf_counter(),
+            'start_frame': start_frame,
+            'last_frame': start_frame,
+            'slider_value': animation_progress,
+            'frame_cost': previous_clock['frame_cost'] if previous_clock else 0.0,
+            'skipped': 0,
+        }
+
+        # 한 번의 프래그먼트 실행이 한 프레임입니다. 프레임 사이에는 서버 스레드를 붙잡지 않으므로
+        # 정지 버튼이나 파라미터 변경이 다음 프레임 안에 반영됩니다.
+        # 측정된 프레임 처리 시간보다 짧은 간격으로는 요청하지 않습니다.
+        @st.fragment(run_every=max(1 / animation_fps, st.session_state.animation_clock['frame_cost']))
+        def play_animation_frame():
+            clock = st.session_state.get('animation_clock')
+            if clock is None:
+                return
+            frame_recorder = Recorder(enabled=diagnostics_recorder.enabled).activate()
+            frame_start = time.perf_counter()
+            i = schedule_animation_frame(clock, frame_start, animation_fps, ANIMATION_FRAME_COUNT)
+
+            with frame_recorder.span('전체', 'frame'):
+                # 렌즈 시스템의 현재 X 위치 (시뮬레이션 진행도에 따라)
+                current_lens_x_ratio = lens_x_ratio_frames[i]
+                current_lens_x_display = current_lens_x_ratio * R_E_display
+            
+                # 행성의 렌즈 별 기준 공전 위치
+                current_planet_x_relative = planet_x_frames[i]
+                current_planet_y_relative = planet_y_frames[i]
+
+                update_lensing_visualization(
+                    current_lens_x_display, 
+                    current_lens_y_display,
+                    current_planet_x_relative, 
+                    current_planet_y_relative, 
+                    lensing_artists
+                )
+                draw_and_show(visualization_placeholder, fig_lensing, lensing_background, lensing_artists.values(),
+                              frame_recorder)
+
+                # 밝기 곡선을 그릴 때 행성 위치는 해당 시뮬레이션 프레임의 행성 위치를 사용 (미리 계산된 행)
+                magnifications_curve_animated = magnifications_frames[i]
+                update_light_curve(
+                    magnifications_curve_animated,
+                    current_lens_x_ratio,
+                    current_mag_frames[i],
+                    light_curve_artists
+                )
+                draw_and_show(light_curve_placeholder, fig_light_curve, light_curve_background,
+                              light_curve_artists.values(), frame_recorder)
+
+            # 프레임 처리 시간의 지수 이동 평균
+            clock['frame_cost'] = 0.8 * clock['frame_cost'] + 0.2 * (time.perf_counter() - frame_start)
+            progress_bar.progress(i / (ANIMATION_FRAME_COUNT - 1), text=(
+                f"프레임 {i}/{ANIMATION_FRAME_COUNT - 1} · 프레임 처리 {clock['frame_cost'] * 1000:.0f} ms"
+                f" · 건너뛴 프레임 {clock['skipped']}"
+            ))
+            record_diagnostics(frame_recorder, 'frame', stage_prefix='애니메이션 프레임: ')
+
+            if i == ANIMATION_FRAME_COUNT - 1:
+                # 마지막 프레임: 재생을 끝내고 앱 전체를 다시 실행해 정적인 화면으로 돌아감
+                st.session_state.animating = False
+                st.session_state.animation_clock = None
+                st.session_state.animation_progress_pending = i
+                st.rerun()
+
+        play_animation_frame()
 
 # 슬라이더로 직접 조절 시에도 시각화 및 곡선 업데이트
 else:
@@ -336,60 +662,145 @@ else:
     current_lens_y_display = u_lens_y_impact_parameter * R_E_display
 
     # 행성의 렌즈 별 기준 공전 위치
-    current_planet_angle_rad = np.deg2rad(planet_initial_angle_deg + (animation_progress / 100) * 360 / planet_orbital_period_factor)
-    current_planet_x_relative = planet_separation_from_lens * np.cos(current_planet_angle_rad)
-    current_planet_y_relative = planet_separation_from_lens * np.sin(current_planet_angle_rad)
+    current_planet_x_relative, current_planet_y_relative = compute_planet_position(
+        planet_initial_angle_deg, animation_progress / 100, planet_orbital_period_factor, planet_separation_from_lens
+    )
 
     update_lensing_visualization(
         current_lens_x_display, 
         current_lens_y_display,
         current_planet_x_relative, 
         current_planet_y_relative, 
-        ax_lensing
+        lensing_artists
     )
-    visualization_placeholder.pyplot(fig_lensing)
+    draw_and_show(visualization_placeholder, fig_lensing, lensing_background, lensing_artists.values())
 
-    magnifications_curve_static = []
-    for lens_x_ratio_for_curve in u_values_x_curve:
-        mag = calculate_magnification(
-            u_source_x=-lens_x_ratio_for_curve, 
+    def magnifications_of_x(x):
+        return MAGNIFICATION_MODELS[magnification_model](
+            u_source_x=-x, 
             u_source_y=-u_lens_y_impact_parameter,
             u_planet_x=current_planet_x_relative, 
             u_planet_y=current_planet_y_relative, 
             mass_ratio=planet_mass_ratio,
             source_size=source_radius_ratio
         )
-        magnifications_curve_static.append(mag)
-
-    ax_light_curve.clear()
-    ax_light_curve.plot(u_values_x_curve, magnifications_curve_static, color='blue', linewidth=2) 
-    
-    ax_light_curve.set_title("배경 별 밝기 변화 (광도 증폭률)")
-    ax_light_curve.set_xlabel(f"렌즈 시스템 상대 X거리 (아인슈타인 반경의 배수)")
-    ax_light_curve.set_ylabel("광도 증폭률")
-    ax_light_curve.grid(True)
-    ax_light_curve.set_ylim(bottom=1.0)
-    
-    # 현재 슬라이더 지점 표시
-    current_mag_at_slider_point = calculate_magnification(
-        u_source_x=-current_lens_x_ratio, 
-        u_source_y=-u_lens_y_impact_parameter,
-        u_planet_x=current_planet_x_relative, 
-        u_planet_y=current_planet_y_relative, 
-        mass_ratio=planet_mass_ratio,
-        source_size=source_radius_ratio
+
+    def compute_static_curve():
+        if adaptive_sampling:
+            u_values_x, magnifications_curve = adaptive_sample(magnifications_of_x, u_min_curve, u_max_curve)
+        else:
+            u_values_x, magnifications_curve = u_values_x_curve, magnifications_of_x(u_values_x_curve)
+        # 현재 슬라이더 지점의 증폭률
+        current_mag = magnifications_of_x(current_lens_x_ratio)
+        return np.array(u_values_x), magnifications_curve, np.asarray(current_mag)
+
+    # 같은 슬라이더 값이면 (다른 세션의 결과라도) 캐시에서 가져옴
+    static_curve_key = quantize_params(
+        ('static', magnification_model, adaptive_sampling),
+        relative_velocity_factor=relative_velocity_factor,
+        u_lens_y_impact_parameter=u_lens_y_impact_parameter,
+        planet_initial_angle_deg=planet_initial_angle_deg,
+        planet_orbital_period_factor=planet_orbital_period_factor,
+        planet_separation_from_lens=planet_separation_from_lens,
+        planet_mass_ratio=planet_mass_ratio,
+        source_radius_ratio=source_radius_ratio,
+        animation_progress=animation_progress
     )
-    ax_light_curve.plot([current_lens_x_ratio], 
-                        [current_mag_at_slider_point], 
-                        'ro', markersize=8, label='현재 렌즈 시스템 위치')
-    ax_light_curve.legend()
-    light_curve_placeholder.pyplot(fig_light_curve)
+    with diagnostics_recorder.span('증폭률 계산'):
+        u_values_x_sampled, magnifications_curve_static, current_mag_at_slider_point = light_curve_cache.get_or_compute(
+            static_curve_key, compute_static_curve
+        )
+
+    # 관측 데이터와 현재 모델 곡선 대비 잔차를 같은 스트리밍 패스로 축소
+    observation_pyramids = (get_observation_pyramids(static_curve_key, magnifications_of_x)
+                            if observation is not None else None)
+
+    with diagnostics_recorder.span('그림 그리기'):
+        fig_light_curve, light_curve_artists, light_curve_background = prepare_light_curve_figure(
+            static_curve_key, u_values_x_sampled, magnifications_curve_static, observation_pyramids
+        )
+
+    # 현재 슬라이더 지점 표시
+    update_light_curve(magnifications_curve_static, current_lens_x_ratio, current_mag_at_slider_point, light_curve_artists)
+    draw_and_show(light_curve_placeholder, fig_light_curve, light_curve_background, light_curve_artists.values())
+
+    if observation is not None:
+        # 잔차도 보이는 X 범위만 픽셀 폭에 맞춰 축소해서 그림
+        with diagnostics_recorder.span('그림 그리기'):
+            fig_residual, ax_residual = figure_pool.axes('residual', (8, 2.5))
+            residual_rows = query_pyramid(observation_pyramids['residual'], observation[:, 0],
+                                          *observation_time_of_x(overlay_x_range),
+                                          max(int(ax_residual.get_window_extent().width), 1))
+            residual_x = observation_x_of_time(observation[residual_rows, 0])
+            ax_residual.plot(residual_x, observation[residual_rows, 1] / overlay_baseline - magnifications_of_x(residual_x),
+                             color='gray', linewidth=0.8)
+            ax_residual.axhline(0, color='blue', linewidth=1)
+            ax_residual.set_xlim(overlay_x_range)
+            ax_residual.set_title(f"현재 모델 곡선 대비 잔차 (전체 {len(observation):,}개 관측, RMS {observation_pyramids['residual']['rms']:.4g})")
+            ax_residual.set_xlabel("렌즈 시스템 상대 X거리 (아인슈타인 반경의 배수)")
+            ax_residual.set_ylabel("증폭률 잔차")
+            ax_residual.grid(True)
+        with diagnostics_recorder.span('PNG 변환 (pyplot)'):
+            residual_placeholder.pyplot(fig_residual)
+
+# --- 애니메이션 파일로 내보내기 ---
+EXPORT_MIME_TYPES = {'gif': 'image/gif', 'mp4': 'video/mp4'}
+
+with st.expander("애니메이션 파일로 내보내기"):
+    st.write("현재 파라미터의 애니메이션 전체 프레임(시스템 시각화 + 밝기 곡선)을 여러 프로세스에서 그려 파일로 만듭니다. "
+             "여러 파라미터 조합이나 PNG 연속 이미지는 `python animation_export.py --help`를 참고하세요.")
+    # MP4는 서버에 ffmpeg가 있을 때만
+    export_formats = ['gif', 'mp4'] if shutil.which('ffmpeg') else ['gif']
+    export_format = st.selectbox("파일 형식", export_formats, format_func=str.upper)
+    run_export = st.button("내보내기 파일 만들기")
+
+    if run_export:
+        export_progress = st.progress(0, text="프레임을 그리는 중...")
+
+        def report_export_progress(done, total):
+            export_progress.progress(done / total, text=f"프레임을 그리는 중... ({done}/{total})")
+
+        with tempfile.TemporaryDirectory() as export_dir:
+            export_path = os.path.join(export_dir, f"animation.{export_format}")
+            export_animation(
+                {
+                    'planet_initial_angle_deg': planet_initial_angle_deg,
+                    'source_radius_ratio': source_radius_ratio,
+                    'planet_mass_ratio': planet_mass_ratio,
+                    'planet_separation_from_lens': planet_separation_from_lens,
+                    'relative_velocity_factor': relative_velocity_factor,
+                    'u_lens_y_impact_parameter': u_lens_y_impact_parameter,
+                    'planet_orbital_period_factor': planet_orbital_period_factor,
+                },
+                export_path,
+                export_format,
+                model=magnification_model,
+                adaptive=adaptive_sampling,
+                fps=animation_fps,
+                progress_callback=report_export_progress
+            )
+            with open(export_path, 'rb') as export_file:
+                st.session_state.export_result = (export_format, export_file.read())
+        export_progress.empty()
+
+    if 'export_result' in st.session_state:
+        exported_format, exported_data = st.session_state.export_result
+        st.download_button(f"{exported_format.upper()} 내려받기", exported_data,
+                           file_name=f"microlensing_animation.{exported_format}", mime=EXPORT_MIME_TYPES[exported_format])
+
+st.sidebar.caption(
+    f"밝기 곡선 캐시: 적중 {light_curve_cache.hits} / 미스 {light_curve_cache.misses}, "
+    f"{len(light_curve_cache)}개 항목, {light_curve_cache.current_bytes / 1024 / 1024:.1f} / {LIGHT_CURVE_CACHE_MAX_MB:.0f} MB"
+)
 
 # --- 유효 증폭률 분포: 배경 별 크기의 영향 ---
 st.subheader("🌠 유효 증폭률 분포: 배경 별 크기의 영향")
-st.write("배경 별의 크기(`source_radius_ratio`)가 단일 렌즈에 의한 밝기 곡선의 최대 증폭률에 어떤 영향을 미치는지 보여줍니다. 배경 별이 커질수록 피크가 뭉툭해지는 것을 볼 수 있습니다.")
-
-fig_effective_mag, ax_effective_mag = plt.subplots(figsize=(8, 4))
+st.write("배경 별의 크기(`source_radius_ratio`)가 단일 렌즈에 의한 밝기 곡선의 최대 증폭률에 어떤 영향을 미치는지 보여줍니다. 배경 별이 커질수록 피크가 뭉툭해지는 것을 볼 수 있습니다. "
+         "배경 별 원반 전체에 대해 적분한 유한 광원 증폭률이며, 별의 가장자리가 중심보다 어두운 주변 감광 효과도 포함합니다.")
+limb_darkening = st.slider(
+    "주변 감광 계수 Γ (0: 균일한 원반)",
+    min_value=0.0, max_value=1.0, value=DEFAULT_LIMB_DARKENING, step=0.05
+)
 
 test_source_sizes = [0.001, 0.01, 0.05, 0.1]
 colors = ['purple', 'green', 'blue', 'red']
@@ -397,29 +808,164 @@ labels = [f'Size: {s:.3f}' for s in test_source_sizes]
 
 u_values_for_effect_mag = np.linspace(-1.0, 1.0, 200)
 
-for i, s_size in enumerate(test_source_sizes):
-    magnifications = []
-    for u_val in u_values_for_effect_mag:
-        # 단일 렌즈의 증폭률만 계산 (행성 효과 배제)
-        mag = calculate_magnification(
-            u_source_x=u_val,
-            u_source_y=0.0, 
-            u_planet_x=0.0,
-            u_planet_y=0.0,
-            mass_ratio=0.0, 
-            source_size=s_size
+
+@st.cache_resource
+def compute_source_size_reference_curves(limb_darkening):
+    """사이드바 슬라이더와 무관한 광원 크기별 기준 곡선. 주변 감광 계수마다 프로세스당 한 번만 계산합니다."""
+    # 단일 렌즈의 유한 광원 증폭률, 광원 크기별 곡선을 한 번에 계산 (크기 수 x 샘플 수)
+    magnifications = finite_source_magnification(
+        np.abs(u_values_for_effect_mag)[np.newaxis, :],
+        np.asarray(test_source_sizes)[:, np.newaxis],
+        limb_darkening
+    )
+    magnifications.setflags(write=False)
+    return magnifications
+
+
+@st.cache_data(max_entries=64)
+def render_source_size_figure(limb_darkening, source_radius_ratio):
+    """
+    광원 크기별 증폭률 그림의 PNG (st.pyplot과 같은 dpi=200, bbox_inches='tight').
+    주변 감광 계수와 광원 크기에만 의존하므로 같은 값이면 (다른 세션이라도) 다시 그리지 않습니다.
+    """
+    magnifications_by_size = compute_source_size_reference_curves(limb_darkening)
+    # 사이드바에서 고른 광원 크기 (보간표만 읽으므로 가벼움)
+    magnifications_current_size = finite_source_magnification(np.abs(u_values_for_effect_mag), source_radius_ratio,
+                                                              limb_darkening)
+
+    # 세션 사이에 공유하지 않는 Figure에 그림 (캐시 미스는 여러 세션에서 동시에 일어날 수 있음)
+    fig_effective_mag, ax_effective_mag = create_figure((8, 4))
+    for i, magnifications in enumerate(magnifications_by_size):
+        ax_effective_mag.plot(u_values_for_effect_mag, magnifications, color=colors[i], label=labels[i])
+    ax_effective_mag.plot(u_values_for_effect_mag, magnifications_current_size,
+                          color='black', linestyle='--', label=f'현재 크기: {source_radius_ratio:.3f}')
+
+    ax_effective_mag.set_title("배경 별 크기에 따른 단일 렌즈 증폭률")
+    ax_effective_mag.set_xlabel("렌즈 중심으로부터의 거리 (u)")
+    ax_effective_mag.set_ylabel("광도 증폭률")
+    ax_effective_mag.grid(True)
+    ax_effective_mag.set_ylim(bottom=1.0)
+    ax_effective_mag.legend()
+
+    image = io.BytesIO()
+    fig_effective_mag.savefig(image, format='png', dpi=200, bbox_inches='tight')
+    return image.getvalue()
+
+
+with diagnostics_recorder.span('그림 그리기'):
+    effective_mag_png = render_source_size_figure(limb_darkening, source_radius_ratio)
+with diagnostics_recorder.span('PNG 변환'):
+    st.image(effective_mag_png, width='stretch')
+
+# --- 행성 검출 효율 지도 ---
+st.subheader("🔍 행성 검출 효율 지도")
+st.write("행성 질량비와 궤도 반경의 조합마다 충격 인자, 행성 공전 위상, 배경 별 크기를 무작위로 바꿔 가며 밝기 곡선을 계산하고, "
+         "단일 렌즈 곡선과의 차이가 문턱값을 넘어 행성 신호가 검출되는 확률을 보여줍니다. (사이드바에서 고른 증폭률 모델을 사용합니다.)")
+
+with st.expander("검출 효율 계산 설정"):
+    detection_grid_size = st.slider("격자 크기 (한 축의 칸 수)", min_value=4, max_value=20, value=8, step=1)
+    detection_trials = st.slider("칸당 무작위 궤적 수", min_value=50, max_value=2000, value=300, step=50)
+    detection_threshold = st.slider(
+        "검출 문턱값 (단일 렌즈 대비 상대 편차)",
+        min_value=0.01, max_value=0.5, value=DETECTION_THRESHOLD, step=0.01
+    )
+    detection_seed = st.number_input("난수 시드", min_value=0, value=0, step=1)
+    run_detection = st.button("검출 효율 지도 계산")
+
+detection_mass_ratios = np.geomspace(1e-6, 1e-2, detection_grid_size)
+detection_separations = np.linspace(0.5, 2.0, detection_grid_size)
+
+if run_detection:
+    detection_progress = st.progress(0, text="검출 효율 계산 중...")
+
+    def report_detection_progress(done, total, partial_map):
+        detection_progress.progress(done / total, text=f"검출 효율 계산 중... ({done}/{total} 칸)")
+
+    st.session_state.detection_result = (
+        detection_mass_ratios,
+        detection_separations,
+        compute_detection_map(
+            detection_mass_ratios,
+            detection_separations,
+            n_trials=detection_trials,
+            base_seed=int(detection_seed),
+            model=magnification_model,
+            threshold=detection_threshold,
+            progress_callback=report_detection_progress
         )
-        magnifications.append(mag)
-    ax_effective_mag.plot(u_values_for_effect_mag, magnifications, color=colors[i], label=labels[i])
+    )
+    detection_progress.empty()
+
+if 'detection_result' in st.session_state:
+    result_mass_ratios, result_separations, detection_map = st.session_state.detection_result
+    fig_detection, ax_detection = figure_pool.axes('detection', (8, 5))
+    mesh = ax_detection.pcolormesh(result_separations, result_mass_ratios, detection_map, shading='nearest',
+                                   cmap='viridis', vmin=0, vmax=1)
+    fig_detection.colorbar(mesh, ax=ax_detection, label="검출 확률")
+    # 현재 사이드바의 행성 파라미터 위치
+    ax_detection.plot([planet_separation_from_lens], [planet_mass_ratio], 'r*', markersize=14, label='현재 행성 파라미터')
+    ax_detection.set_yscale('log')
+    ax_detection.set_title("행성 검출 효율 지도")
+    ax_detection.set_xlabel("행성-렌즈 별 궤도 반경 (아인슈타인 반경 대비)")
+    ax_detection.set_ylabel("외계 행성 질량 (렌즈 별 질량 대비)")
+    ax_detection.legend()
+    with diagnostics_recorder.span('PNG 변환 (pyplot)'):
+        st.pyplot(fig_detection)
+
+# --- 관측 광도 곡선 맞춤 ---
+st.subheader("📈 관측 광도 곡선 맞춤")
+st.write("시간, 플럭스[, 플럭스 오차] 열로 된 CSV 파일을 올리면 충격 인자, 상대 속도, 행성 질량비, 궤도 반경, 공전 위상, "
+         "배경 별 크기를 관측 데이터에 맞춥니다. (사이드바에서 고른 증폭률 모델을 사용합니다.)")
+
+photometry_file = st.file_uploader("관측 데이터 (CSV)", type=['csv'])
+fit_starts = st.slider("병렬 시작점 수", min_value=2, max_value=32, value=8, step=1,
+                       help="서로 다른 무작위 시작점에서 동시에 맞춤을 진행하고, 확실히 나쁜 시작점은 일찍 중단합니다.")
+fit_model_supported = magnification_model in FIT_MODELS
+if not fit_model_supported:
+    st.info("광선 추적 지도 모델은 파라미터가 바뀔 때마다 새 증폭 지도를 계산해야 해서 맞춤에 쓸 수 없습니다. "
+            "사이드바에서 다른 증폭률 모델을 고르세요.")
+run_fit = st.button("맞춤 시작", disabled=photometry_file is None or not fit_model_supported)
+
+if run_fit:
+    try:
+        fit_time, fit_flux, fit_flux_err = load_photometry_csv(photometry_file)
+    except ValueError as e:
+        st.error(f"CSV 파일을 읽을 수 없습니다: {e}")
+    else:
+        fit_progress = st.progress(0, text="맞춤 진행 중...")
 
-ax_effective_mag.set_title("배경 별 크기에 따른 단일 렌즈 증폭률")
-ax_effective_mag.set_xlabel("렌즈 중심으로부터의 거리 (u)")
-ax_effective_mag.set_ylabel("광도 증폭률")
-ax_effective_mag.grid(True)
-ax_effective_mag.set_ylim(bottom=1.0)
-ax_effective_mag.legend()
+        def report_fit_progress(round_index, max_rounds, n_alive, best_chi2):
+            fit_progress.progress(round_index / max_rounds,
+                                  text=f"맞춤 진행 중... (라운드 {round_index}, 남은 시작점 {n_alive}, 최소 카이제곱 {best_chi2:.1f})")
 
-st.pyplot(fig_effective_mag)
+        try:
+            fit_result = fit_light_curve(fit_time, fit_flux, fit_flux_err, n_starts=fit_starts, model=magnification_model,
+                                         progress_callback=report_fit_progress)
+        except ValueError as e:
+            st.error(f"맞춤에 실패했습니다: {e}")
+        else:
+            st.session_state.fit_result = (fit_time, fit_flux, fit_flux_err, magnification_model, fit_result)
+        finally:
+            fit_progress.empty()
+
+if 'fit_result' in st.session_state:
+    fit_time, fit_flux, fit_flux_err, fit_model, fit_result = st.session_state.fit_result
+    st.table({name: [f"{value:.6g}"] for name, value in fit_result.items()})
+
+    model_time = np.linspace(fit_time.min(), fit_time.max(), 2000)
+    # 맞출 때 쓴 모델로 그림 (그 뒤에 사이드바 모델을 바꿔도 같은 곡선)
+    model_flux = fitted_model_flux(fit_result, model_time, fit_model)
+
+    fig_fit, ax_fit = figure_pool.axes('fit', (8, 4))
+    ax_fit.errorbar(fit_time, fit_flux, yerr=fit_flux_err, fmt='.', color='gray', markersize=2, alpha=0.5, label='관측 데이터')
+    ax_fit.plot(model_time, model_flux, color='blue', linewidth=2, label='맞춘 모델')
+    ax_fit.set_title("관측 광도 곡선과 맞춘 모델")
+    ax_fit.set_xlabel("시간")
+    ax_fit.set_ylabel("플럭스")
+    ax_fit.grid(True)
+    ax_fit.legend()
+    with diagnostics_recorder.span('PNG 변환 (pyplot)'):
+        st.pyplot(fig_fit)
 
 # --- 7. 추가 정보 섹션 ---
 st.markdown("---")
@@ -441,3 +987,33 @@ st.write("""
 
 아인슈타인 반경은 렌즈 별의 **질량**과 **거리**에 따라 달라지며, 중력 렌즈 효과의 '영향권'을 나타내는 척도가 됩니다. 외계 행성을 미세 중력 렌즈로 탐사할 때, 배경 별의 경로가 이 아인슈타인 반경 근처를 지나가야 행성의 서명(밝기 변화)을 포착할 가능성이 높아집니다.
 """)
+
+# --- 진단 모드 패널 ---
+st.sidebar.checkbox(
+    "진단 모드 (단계별 실행 시간)",
+    key='diagnostics_enabled',
+    help="실행마다 폰트 설정, 물리 설정, 증폭률 계산, 그림 그리기, PNG 변환, 애니메이션 프레임의 시간을 재고 "
+         "최근 측정값의 백분위수를 보여줍니다. Chrome 트레이스 파일로 내려받을 수 있습니다."
+)
+if diagnostics_recorder.enabled:
+    diagnostics_recorder.record_total('실행 전체')
+    record_diagnostics(diagnostics_recorder, 'rerun')
+    diagnostics_percentiles = st.session_state.diagnostics_stats.percentiles()
+    st.sidebar.table({
+        '단계': list(diagnostics_percentiles),
+        '측정 수': [count for count, *_ in diagnostics_percentiles.values()],
+        **{f'p{p} (ms)': [f"{values[k] * 1000:.1f}" for _, *values in diagnostics_percentiles.values()]
+           for k, p in enumerate(PERCENTILES)},
+    })
+    st.sidebar.caption("이번 실행의 증폭률 계산: " + (", ".join(
+        f"{name} {calls}회 ({points:,}점)" for name, (calls, points) in diagnostics_recorder.call_counts.items()
+    ) or "없음 (캐시 적중)"))
+    diagnostics_trace = st.session_state.diagnostics_trace
+    st.sidebar.download_button(
+        "트레이스 내려받기 (Chrome 트레이스 JSON)",
+        lambda: chrome_trace_json(diagnostics_trace),
+        file_name="microlensing_trace.json",
+        mime="application/json",
+        on_click='ignore',
+        help="chrome://tracing 또는 https://ui.perfetto.dev 에서 열 수 있습니다."
+    )
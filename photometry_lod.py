@@ -0,0 +1,224 @@
+import contextlib
+import hashlib
+import io
+import itertools
+import os
+
+import numpy as np
+
+from disk_cache import evict_least_recently_used, touch
+
+# --- 대용량 관측 광도 곡선: 디스크 기반 읽기와 화면 해상도에 맞춘 축소 (최소/최대 피라미드) ---
+# CSV(시간, 플럭스)는 청크 단위로 읽어 (행 수 x 2) .npy 파일로 한 번 변환하고, 이후에는 메모리 맵으로만 접근합니다.
+# 피라미드 0단계는 BASE_BUCKET개 행마다의 최솟값/최댓값(과 그 행 번호), 그 위 단계는 LEVEL_FANOUT개씩 묶은 값입니다.
+# 화면에는 보이는 X 범위의 픽셀 열마다 최솟값/최댓값 두 점만 보냅니다.
+
+PHOTOMETRY_CACHE_DIR = os.environ.get(
+    "PHOTOMETRY_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".photometry_cache")
+)
+# 설정하면 이 디렉터리 안의 CSV 파일을 서버 경로로 열 수 있습니다. 설정하지 않으면 업로드만 받습니다.
+PHOTOMETRY_DATA_DIR = os.environ.get("PHOTOMETRY_DATA_DIR")
+CHUNK_ROWS = 1 << 18 # 한 번에 읽고 처리하는 행 수 (BASE_BUCKET의 배수)
+# 변환된 .npy 캐시의 크기와 나이 상한. 넘으면 가장 오래 쓰지 않은 파일부터 지웁니다 (업로드를 무한히 쌓아 두지 않도록).
+PHOTOMETRY_CACHE_MAX_BYTES = int(os.environ.get("PHOTOMETRY_CACHE_MAX_BYTES", 2 << 30))
+PHOTOMETRY_CACHE_MAX_AGE_S = float(os.environ.get("PHOTOMETRY_CACHE_MAX_AGE_S", 7 * 24 * 3600))
+HASH_BLOCK_BYTES = 1 << 20 # 업로드 내용의 해시를 계산할 때 한 번에 읽는 바이트 수
+BASE_BUCKET = 64 # 피라미드 0단계 한 칸의 행 수
+LEVEL_FANOUT = 8 # 피라미드 한 단계 위로 갈 때 묶는 칸 수
+
+
+def _data_lines(text_stream):
+    """빈 줄과 숫자가 아닌 머리글 줄을 건너뛴 데이터 줄들"""
+    for line in text_stream:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            float(line.split(',', 1)[0])
+        except ValueError:
+            continue
+        yield line
+
+
+def csv_to_npy(open_stream, out_path, chunk_rows=CHUNK_ROWS):
+    """
+    CSV를 두 번 훑어 (행 수 x 2) float64 .npy 파일로 씁니다. 첫 번째는 행 수 세기, 두 번째는 청크 단위 변환입니다.
+    open_stream(): 처음부터 읽는 텍스트 스트림을 새로 여는 함수. 시간은 오름차순이어야 합니다.
+    """
+    with open_stream() as stream:
+        n_rows = sum(1 for _ in _data_lines(stream))
+
+    tmp_path = f"{out_path}.{os.getpid()}.tmp.npy"
+    table = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.float64, shape=(n_rows, 2))
+    try:
+        row = 0
+        last_time = -np.inf
+        with open_stream() as stream:
+            lines = _data_lines(stream)
+            while chunk := list(itertools.islice(lines, chunk_rows)):
+                values = np.loadtxt(chunk, delimiter=',', usecols=(0, 1), ndmin=2)
+                if values[0, 0] < last_time or np.any(np.diff(values[:, 0]) < 0):
+                    raise ValueError("관측 시간이 오름차순으로 정렬되어 있어야 합니다.")
+                table[row:row + len(values)] = values
+                row += len(values)
+                last_time = values[-1, 0]
+        table.flush()
+        table = None
+        os.replace(tmp_path, out_path)
+    finally:
+        # 읽기 오류(잘못된 CSV 등)로 중간에 멈추면 반쯤 쓴 임시 파일을 남기지 않음
+        table = None
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def resolve_data_path(relative_path, data_dir=PHOTOMETRY_DATA_DIR):
+    """
+    데이터 디렉터리 기준 상대 경로를 실제 경로로 바꿉니다.
+    절대 경로, '..', 심볼릭 링크로 데이터 디렉터리 밖을 가리키면 ValueError를 냅니다.
+    """
+    if not data_dir:
+        raise ValueError("서버 데이터 디렉터리(PHOTOMETRY_DATA_DIR)가 설정되어 있지 않습니다.")
+    real_dir = os.path.realpath(data_dir)
+    real_path = os.path.realpath(os.path.join(real_dir, relative_path))
+    if os.path.commonpath([real_dir, real_path]) != real_dir:
+        raise ValueError("데이터 디렉터리 밖의 파일은 열 수 없습니다.")
+    return real_path
+
+
+def content_hash(binary_stream, block_bytes=HASH_BLOCK_BYTES):
+    """바이너리 스트림 전체의 SHA-256 (block_bytes씩 나누어 읽으므로 내용을 한 번에 복사하지 않음)"""
+    digest = hashlib.sha256()
+    binary_stream.seek(0)
+    while block := binary_stream.read(block_bytes):
+        digest.update(block)
+    return digest.hexdigest()
+
+
+def open_photometry(source, cache_dir=PHOTOMETRY_CACHE_DIR):
+    """
+    서버의 CSV 경로 또는 업로드된 파일 객체를 (행 수 x 2) 메모리 맵으로 엽니다.
+    변환된 .npy는 cache_dir에 저장되어, 같은 파일은 다시 변환하지 않습니다.
+    새 파일을 저장할 때마다 캐시 전체를 PHOTOMETRY_CACHE_MAX_BYTES, PHOTOMETRY_CACHE_MAX_AGE_S 안으로 줄입니다.
+    업로드는 파일 이름과 크기가 같아도 내용이 다를 수 있으므로 (다른 사용자의 파일일 수도 있음) 내용의 해시로 구별합니다.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        stat = os.stat(source)
+        key = f"{os.path.abspath(source)}-{stat.st_size}-{stat.st_mtime_ns}"
+        open_stream = lambda: open(source, encoding='utf-8')
+    else:
+        key = f"upload-{content_hash(source)}"
+
+        @contextlib.contextmanager
+        def open_stream():
+            # 업로드된 바이너리 버퍼를 닫지 않고 텍스트로 읽음
+            source.seek(0)
+            wrapper = io.TextIOWrapper(source, encoding='utf-8', newline='')
+            try:
+                yield wrapper
+            finally:
+                wrapper.detach()
+
+    out_path = os.path.join(cache_dir, hashlib.sha1(key.encode('utf-8')).hexdigest() + ".npy")
+    if os.path.exists(out_path):
+        touch(out_path)
+    else:
+        os.makedirs(cache_dir, exist_ok=True)
+        csv_to_npy(open_stream, out_path)
+        evict_least_recently_used(cache_dir, "*.npy", PHOTOMETRY_CACHE_MAX_BYTES, PHOTOMETRY_CACHE_MAX_AGE_S,
+                                  keep=(out_path,))
+    return np.load(out_path, mmap_mode='r')
+
+
+def _reduce_buckets(vmin, vmax, imin, imax, size):
+    """size개씩 묶어 최솟값/최댓값과 그 행 번호를 구합니다 (마지막 묶음은 모자란 만큼 채워서)."""
+    pad = -len(vmin) % size
+    vmin_groups = np.pad(vmin, (0, pad), constant_values=np.inf).reshape(-1, size)
+    vmax_groups = np.pad(vmax, (0, pad), constant_values=-np.inf).reshape(-1, size)
+    arg_min = np.argmin(vmin_groups, axis=1)
+    arg_max = np.argmax(vmax_groups, axis=1)
+    rows = np.arange(len(arg_min))
+    imin_groups = np.pad(imin, (0, pad)).reshape(-1, size)
+    imax_groups = np.pad(imax, (0, pad)).reshape(-1, size)
+    return vmin_groups[rows, arg_min], vmax_groups[rows, arg_max], imin_groups[rows, arg_min], imax_groups[rows, arg_max]
+
+
+def build_pyramids(time, flux, transforms, chunk_rows=CHUNK_ROWS):
+    """
+    메모리 맵 데이터를 청크 단위로 한 번만 훑으면서, transforms의 각 값(예: 정규화된 플럭스, 모델과의 잔차)에 대한
+    최소/최대 피라미드와 제곱합을 함께 만듭니다.
+    transforms: {이름: f(시간 청크, 플럭스 청크) -> 값 청크}
+    반환값: {이름: {'levels': [단계별 (vmin, vmax, imin, imax)], 'rms': 제곱평균제곱근}}
+    """
+    base = {name: ([], [], [], []) for name in transforms}
+    sum_squares = dict.fromkeys(transforms, 0.0)
+    for start in range(0, len(time), chunk_rows):
+        time_chunk = np.asarray(time[start:start + chunk_rows])
+        flux_chunk = np.asarray(flux[start:start + chunk_rows])
+        rows = np.arange(start, start + len(time_chunk))
+        for name, transform in transforms.items():
+            values = transform(time_chunk, flux_chunk)
+            sum_squares[name] += np.sum(values**2)
+            for part, reduced in zip(base[name], _reduce_buckets(values, values, rows, rows, BASE_BUCKET)):
+                part.append(reduced)
+
+    pyramids = {}
+    for name, parts in base.items():
+        level = tuple(np.concatenate(part) for part in parts)
+        levels = [level]
+        while len(level[0]) > LEVEL_FANOUT:
+            level = _reduce_buckets(*level, LEVEL_FANOUT)
+            levels.append(level)
+        pyramids[name] = {
+            'levels': levels,
+            'rms': np.sqrt(sum_squares[name] / max(len(time), 1)),
+            # 행 범위 [start, stop)의 원래 값 (피라미드 한 칸보다 좁게 확대했을 때 사용)
+            'values': lambda start, stop, transform=transforms[name]: transform(
+                np.asarray(time[start:stop]), np.asarray(flux[start:stop])
+            ),
+        }
+    return pyramids
+
+
+def _pixel_extremes(pixel_of_min, pixel_of_max, vmin, vmax, imin, imax):
+    """픽셀 열마다 가장 작은 vmin의 행 번호와 가장 큰 vmax의 행 번호"""
+    first_min = np.lexsort((vmin, pixel_of_min))
+    first_max = np.lexsort((-vmax, pixel_of_max))
+    min_start = np.r_[True, np.diff(pixel_of_min[first_min]) != 0]
+    max_start = np.r_[True, np.diff(pixel_of_max[first_max]) != 0]
+    return np.concatenate([imin[first_min[min_start]], imax[first_max[max_start]]])
+
+
+def query_pyramid(pyramid, time, t_start, t_stop, n_pixels):
+    """
+    [t_start, t_stop] 구간을 n_pixels개의 픽셀 열로 나누어, 열마다 최솟값/최댓값을 가진 행 번호를 돌려줍니다.
+    구간의 행 수가 2 * n_pixels 이하이면 원래 행을 모두 돌려줍니다. (확대하면 보이는 구간만 다시 계산합니다.)
+    픽셀 하나에 들어가는 행 수가 피라미드 0단계 한 칸(BASE_BUCKET행)보다 적으면 한 칸이 여러 픽셀에 걸치므로,
+    피라미드 대신 원래 행(많아야 BASE_BUCKET * n_pixels개)을 직접 픽셀별로 줄입니다.
+    """
+    i_start, i_stop = np.searchsorted(time, [t_start, t_stop])
+    n_rows = i_stop - i_start
+    if n_rows <= 2 * n_pixels:
+        return np.arange(i_start, i_stop)
+
+    def pixel_of(rows):
+        return np.clip(((time[rows] - t_start) / (t_stop - t_start) * n_pixels).astype(np.intp), 0, n_pixels - 1)
+
+    if n_rows < BASE_BUCKET * n_pixels:
+        rows = np.arange(i_start, i_stop)
+        values = pyramid['values'](i_start, i_stop)
+        pixel = pixel_of(rows)
+        return np.unique(_pixel_extremes(pixel, pixel, values, values, rows, rows))
+
+    # 한 칸의 행 수가 픽셀 하나에 들어가는 행 수를 넘지 않는 가장 성긴 단계
+    level_index = 0
+    while (level_index + 1 < len(pyramid['levels'])
+           and BASE_BUCKET * LEVEL_FANOUT**(level_index + 1) <= n_rows / n_pixels):
+        level_index += 1
+    bucket_rows = BASE_BUCKET * LEVEL_FANOUT**level_index
+    vmin, vmax, imin, imax = (part[i_start // bucket_rows:-(-i_stop // bucket_rows)]
+                              for part in pyramid['levels'][level_index])
+
+    # 칸의 최솟값은 그 최솟값 행이 있는 픽셀 열에, 최댓값은 최댓값 행이 있는 픽셀 열에 배정해 열마다 고름
+    rows = _pixel_extremes(pixel_of(imin), pixel_of(imax), vmin, vmax, imin, imax)
+    return np.unique(rows[(rows >= i_start) & (rows < i_stop)])
@@ -0,0 +1,135 @@
+import argparse
+import itertools
+import os
+import time
+from multiprocessing import Pool
+
+import numpy as np
+
+from lensing_core import DEFAULT_PARAMS, LIGHT_CURVE_SAMPLES, MAGNIFICATION_MODELS, compute_einstein_radius_angle, compute_light_curve
+
+# --- 밝기 곡선 라이브러리 생성: 파라미터 격자 스윕 (명령줄) ---
+# 예)
+#   python sweep.py --param planet_mass_ratio=1e-5:1e-2:10:log --param u_lens_y_impact_parameter=0:1.5:16 \
+#       --model polynomial --workers 8 --output library
+# 결과는 --output 디렉터리에 청크마다 압축 .npz 파일(또는 --format parquet이면 하나의 Parquet 파일)로 기록됩니다.
+
+
+def parse_param_spec(spec):
+    """
+    "이름=시작:끝:개수[:log]" 또는 "이름=값1,값2,..." 형식의 스윕 축을 (이름, 값 배열)로 바꿉니다.
+    """
+    name, _, values = spec.partition('=')
+    if name not in DEFAULT_PARAMS:
+        raise argparse.ArgumentTypeError(f"알 수 없는 파라미터: {name} (가능: {', '.join(DEFAULT_PARAMS)})")
+    if ':' in values:
+        parts = values.split(':')
+        if len(parts) not in (3, 4) or (len(parts) == 4 and parts[3] != 'log'):
+            raise argparse.ArgumentTypeError(f"범위 형식이 잘못되었습니다: {spec} (형식: {name}=시작:끝:개수[:log])")
+        start, stop, num = float(parts[0]), float(parts[1]), int(parts[2])
+        if len(parts) == 4:
+            return name, np.geomspace(start, stop, num)
+        return name, np.linspace(start, stop, num)
+    return name, np.array([float(v) for v in values.split(',')])
+
+
+def iter_chunks(iterable, chunk_size):
+    iterator = iter(iterable)
+    while chunk := list(itertools.islice(iterator, chunk_size)):
+        yield chunk
+
+
+def compute_chunk(task):
+    """워커 프로세스: 파라미터 조합 청크의 밝기 곡선들을 (조합 수 x 샘플 수) 배열로 한 번에 계산"""
+    chunk_index, names, combinations, model, n_samples = task
+    columns = {name: np.array([values[k] for values in combinations]) for k, name in enumerate(names)}
+
+    params = {**DEFAULT_PARAMS, **columns}
+    u_values_x, magnifications = compute_light_curve(columns, model, n_samples)
+    columns['einstein_radius_angle'] = np.broadcast_to(
+        compute_einstein_radius_angle(params['lens_mass_solar'], params['observer_lens_distance_kpc']), len(combinations)
+    )
+    columns['u_values_x'] = np.broadcast_to(u_values_x, (len(combinations), n_samples))
+    columns['magnification'] = np.broadcast_to(magnifications, (len(combinations), n_samples))
+    return chunk_index, columns
+
+
+class NpzChunkWriter:
+    """청크마다 압축 .npz 파일 하나를 씁니다 (chunk_00000.npz, chunk_00001.npz, ...)."""
+
+    def __init__(self, output_dir):
+        self.output_dir = output_dir
+        os.makedirs(output_dir, exist_ok=True)
+
+    def write(self, chunk_index, columns):
+        np.savez_compressed(os.path.join(self.output_dir, f"chunk_{chunk_index:05d}.npz"), **columns)
+
+    def close(self):
+        pass
+
+
+class ParquetChunkWriter:
+    """하나의 Parquet 파일에 청크마다 행 그룹을 추가합니다 (pyarrow 필요)."""
+
+    def __init__(self, output_dir):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise SystemExit("Parquet 출력에는 pyarrow가 필요합니다: pip install pyarrow")
+        self._pa, self._pq = pa, pq
+        self._path = os.path.join(output_dir, "light_curves.parquet")
+        self._writer = None
+        os.makedirs(output_dir, exist_ok=True)
+
+    def write(self, chunk_index, columns):
+        pa = self._pa
+        table = pa.table({
+            name: pa.FixedSizeListArray.from_arrays(values.ravel(), values.shape[1]) if values.ndim == 2 else values
+            for name, values in columns.items()
+        })
+        if self._writer is None:
+            self._writer = self._pq.ParquetWriter(self._path, table.schema, compression='zstd')
+        self._writer.write_table(table)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="미세 중력 렌즈 밝기 곡선 파라미터 스윕")
+    parser.add_argument('--param', action='append', type=parse_param_spec, default=[], metavar='NAME=SPEC',
+                        help="스윕할 파라미터: 이름=시작:끝:개수[:log] 또는 이름=값1,값2,... (여러 번 지정 가능)")
+    parser.add_argument('--model', choices=list(MAGNIFICATION_MODELS), default='approximate', help="증폭률 계산 모델")
+    parser.add_argument('--samples', type=int, default=LIGHT_CURVE_SAMPLES, help="곡선당 샘플 수")
+    parser.add_argument('--chunk-size', type=int, default=256, help="청크(출력 파일/행 그룹)당 곡선 수")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="프로세스 수")
+    parser.add_argument('--format', choices=['npz', 'parquet'], default='npz', help="출력 형식")
+    parser.add_argument('--output', required=True, help="출력 디렉터리")
+    args = parser.parse_args(argv)
+
+    names = [name for name, _ in args.param]
+    axes = [values for _, values in args.param]
+    total = int(np.prod([len(values) for values in axes]))
+    tasks = (
+        (chunk_index, names, combinations, args.model, args.samples)
+        for chunk_index, combinations in enumerate(iter_chunks(itertools.product(*axes), args.chunk_size))
+    )
+
+    writer = NpzChunkWriter(args.output) if args.format == 'npz' else ParquetChunkWriter(args.output)
+    start = time.perf_counter()
+    done = 0
+    try:
+        with Pool(args.workers) as pool:
+            # 결과를 순서대로 받아 바로 기록하므로, 메모리에는 진행 중인 청크만 남습니다.
+            for chunk_index, columns in pool.imap(compute_chunk, tasks):
+                writer.write(chunk_index, columns)
+                done += len(columns['magnification'])
+                print(f"{done}/{total} 곡선 완료 ({time.perf_counter() - start:.1f}초)", flush=True)
+    finally:
+        writer.close()
+
+
+if __name__ == '__main__':
+    main()
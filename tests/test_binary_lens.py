@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+
+from binary_lens import calculate_magnification_polynomial, solve_binary_lens_images
+
+
+def reference_magnification(zeta, z2, q):
+    """
+    다항식을 쓰지 않는 기준값: 두 렌즈 주위 격자의 출발점에서 렌즈 방정식 자체를
+    확장 정밀도(clongdouble)의 뉴턴 반복으로 풀고, 같은 이미지를 하나로 합쳐 증폭률을 더합니다.
+    """
+    zeta, z2, q = np.clongdouble(zeta), np.clongdouble(z2), np.longdouble(q)
+    offsets = (np.geomspace(1e-10, 4, 50)[:, np.newaxis]
+               * np.exp(1j * np.linspace(0, 2 * np.pi, 24, endpoint=False))).ravel()
+    z = np.concatenate([offsets, z2 + offsets]).astype(np.clongdouble)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for _ in range(100):
+            conj_z = np.conj(z)
+            f = z - 1 / conj_z - q / (conj_z - np.conj(z2)) - zeta
+            k = 1 / conj_z**2 + q / (conj_z - np.conj(z2))**2
+            step = (-f + k * np.conj(f)) / (1 - np.abs(k)**2)
+            step = np.where(np.isfinite(step), step, 0)
+            # 렌즈 위치(특이점)를 건너뛰지 않도록 한 번에 움직이는 거리를 제한
+            limit = np.minimum(0.1, 0.5 * np.minimum(np.abs(z), np.abs(z - z2)))
+            too_far = np.abs(step) > limit
+            z = z + np.where(too_far, step * limit / np.where(too_far, np.abs(step), 1), step)
+        conj_z = np.conj(z)
+        f = z - 1 / conj_z - q / (conj_z - np.conj(z2)) - zeta
+        k = 1 / conj_z**2 + q / (conj_z - np.conj(z2))**2
+    converged = np.isfinite(f) & (np.abs(f) < 1e-16 * (1 + np.abs(k)) * np.maximum(1, np.abs(z)))
+
+    images = []
+    for image in z[converged]:
+        if all(abs(image - other) > 1e-10 * max(1, abs(other)) for other in images):
+            images.append(image)
+    images = np.array(images)
+    shear = 1 / np.conj(images)**2 + q / (np.conj(images) - np.conj(z2))**2
+    return len(images), float(np.sum(1 / np.abs(1 - np.abs(shear)**2)))
+
+
+def caustic_region(mass_ratio, separation, n, rng):
+    """중심 코스틱과 행성 코스틱 주변의 광원 위치 (작은 q에서 이미지를 놓치기 쉬운 곳)"""
+    width = 3 * np.sqrt(mass_ratio)
+    center = (rng.uniform(-1, 1, n) + 1j * rng.uniform(-1, 1, n)) * width
+    planetary = separation - 1 / separation
+    if separation < 1:
+        # s < 1 이면 행성 코스틱은 렌즈 축 위아래에 두 개 있음
+        planetary = planetary + 2j * np.sqrt(mass_ratio) / (separation * np.sqrt(1 + separation**2)) * rng.choice([-1, 1], n)
+    planet_side = planetary + (rng.uniform(-1, 1, n) + 1j * rng.uniform(-1, 1, n)) * width
+    return np.concatenate([center, planet_side])
+
+
+@pytest.mark.parametrize('mass_ratio, separation', [(1e-6, 1.3), (1e-6, 0.8), (1e-4, 1.0), (1e-2, 1.3)])
+def test_matches_high_precision_reference(mass_ratio, separation):
+    zeta = caustic_region(mass_ratio, separation, 8, np.random.default_rng(0))
+    magnification = calculate_magnification_polynomial(zeta.real, zeta.imag, separation, 0.0, mass_ratio, 0.0)
+    _, is_image = solve_binary_lens_images(zeta, np.full(zeta.size, separation + 0j), np.full(zeta.size, mass_ratio))
+
+    for i, source in enumerate(zeta):
+        n_images, expected = reference_magnification(source, separation, mass_ratio)
+        assert is_image[i].sum() == n_images
+        assert magnification[i] == pytest.approx(expected, rel=1e-9)
+
+
+@pytest.mark.parametrize('mass_ratio', [1e-6, 1e-4, 1e-2])
+def test_image_count_is_three_or_five(mass_ratio):
+    rng = np.random.default_rng(1)
+    zeta = rng.uniform(-2, 2, 20000) + 1j * rng.uniform(-2, 2, 20000)
+    _, is_image = solve_binary_lens_images(zeta, np.full(zeta.size, 1.3 + 0j), np.full(zeta.size, mass_ratio))
+    assert set(np.unique(is_image.sum(axis=-1))) <= {3, 5}
+
+
+def test_zero_mass_ratio_is_point_lens():
+    u_x = np.linspace(-2, 2, 41)
+    magnification = calculate_magnification_polynomial(u_x, 0.1, 1.3, 0.0, 0.0, 0.0)
+    u = np.hypot(u_x, 0.1)
+    np.testing.assert_allclose(magnification, (u**2 + 2) / (u * np.sqrt(u**2 + 4)), rtol=1e-10)
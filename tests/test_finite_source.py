@@ -0,0 +1,16 @@
+import numpy as np
+import pytest
+
+from finite_source import finite_source_magnification, sqrt_profile_magnification, uniform_disk_magnification
+
+
+@pytest.mark.parametrize('limb_darkening', [0.0, 0.5, 1.0])
+def test_table_matches_direct_integration_near_limb_crossing(limb_darkening):
+    # 광원 가장자리가 렌즈를 지나는 z = u/ρ = 1 근처 (균일 원반 성분이 꺾이는 곳)와, log ρ 격자 사이의 ρ
+    rho = np.array([0.001, 0.0037, 0.02, 0.1])[:, np.newaxis]
+    z = np.concatenate([np.linspace(0.2, 3.0, 57), 1 - np.geomspace(1e-7, 0.05, 15), 1 + np.geomspace(1e-7, 0.05, 15)])
+    u = z * rho
+
+    expected = ((1 - limb_darkening) * uniform_disk_magnification(u, rho, n_nodes=512)
+                + limb_darkening * sqrt_profile_magnification(u, rho, n_nodes=96))
+    np.testing.assert_allclose(finite_source_magnification(u, rho, limb_darkening), expected, rtol=1e-4)
@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+from lensing_core import compute_animation_frames
+
+
+def count_planet_rows(planet_initial_angle_deg, planet_orbital_period_factor, n_frames):
+    """compute_animation_frames가 증폭률 함수에 넘기는 고유 행성 위치(행) 수와 결과"""
+    rows = []
+
+    def fake_magnification(u_source_x, u_source_y, u_planet_x, u_planet_y, mass_ratio, source_size):
+        rows.append(np.shape(u_planet_x)[0])
+        return np.broadcast_to(np.hypot(u_planet_x, u_planet_y) + u_source_x * 0, (rows[-1], np.size(u_source_x)))
+
+    frames = compute_animation_frames(np.linspace(-1, 1, 5), 0.1, planet_initial_angle_deg, planet_orbital_period_factor,
+                                      1.0, 1e-3, 0.0, n_frames=n_frames, magnification_fn=fake_magnification)
+    return rows[0], frames
+
+
+@pytest.mark.parametrize('initial_angle', [0.0, 36.0, 72.0, 90.0, 123.4, 359.0])
+def test_repeated_orbit_angles_share_rows(initial_angle):
+    # 주기 인자 0.1: 100 간격 동안 10바퀴 -> 한 간격에 36도, 고유 각도는 10개
+    n_rows, (planet_x, planet_y, _, _) = count_planet_rows(initial_angle, 0.1, 101)
+    assert n_rows == 10
+    np.testing.assert_allclose(planet_x[::10], planet_x[0], atol=1e-12)
+    np.testing.assert_allclose(planet_y[::10], planet_y[0], atol=1e-12)
+
+
+def test_one_orbit_first_and_last_frames_share_row():
+    n_rows, _ = count_planet_rows(0.0, 1.0, 101)
+    assert n_rows == 100
+
+
+@pytest.mark.parametrize('initial_angle', [
+    0.0, -0.0, 360.0,
+    np.nextafter(0.0, -1), np.nextafter(0.0, 1),
+    np.nextafter(360.0, 0), np.nextafter(360.0, 720),
+    360.0 - 4 * np.spacing(360.0), 360.0 + 4 * np.spacing(360.0),
+])
+def test_angles_near_zero_and_full_turn_map_to_same_row(initial_angle):
+    # 처음과 마지막 프레임은 정확히 한 바퀴 차이: 0도/360도 근처에서도 한 행으로 묶여야 함
+    n_rows, (planet_x, planet_y, _, _) = count_planet_rows(initial_angle, 1.0, 2)
+    assert n_rows == 1
+    assert planet_x[0] == pytest.approx(1.0) and planet_y[0] == pytest.approx(0.0, abs=1e-12)
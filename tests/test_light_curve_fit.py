@@ -0,0 +1,35 @@
+import io
+
+import numpy as np
+import pytest
+
+from light_curve_fit import fit_light_curve, load_photometry_csv
+
+
+def test_load_photometry_csv_skips_header_and_defaults_errors():
+    time, flux, flux_err = load_photometry_csv(io.StringIO("time,flux\n1,2\n2,3\n"))
+    np.testing.assert_array_equal(time, [1, 2])
+    np.testing.assert_array_equal(flux, [2, 3])
+    np.testing.assert_array_equal(flux_err, [1, 1])
+
+
+@pytest.mark.parametrize('text', [
+    "1,2\n",              # 관측 한 행: 시간 폭이 0
+    "1,2\n1,3\n",         # 모든 시각이 같음
+    "1,2,0.1\n2,3,0\n",   # 오차 0 -> 가중치 무한대
+    "1,2,0.1\n2,3,-1\n",
+    "1,2\n2,nan\n",
+])
+def test_load_photometry_csv_rejects_unfittable_data(text):
+    with pytest.raises(ValueError):
+        load_photometry_csv(io.StringIO(text))
+
+
+def test_fit_light_curve_rejects_zero_time_span_before_starting_workers():
+    with pytest.raises(ValueError):
+        fit_light_curve(np.array([5.0, 5.0]), np.array([1.0, 2.0]))
+
+
+def test_fit_light_curve_rejects_raytrace_model():
+    with pytest.raises(ValueError):
+        fit_light_curve(np.array([0.0, 1.0]), np.array([1.0, 2.0]), model='raytrace')
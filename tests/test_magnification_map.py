@@ -0,0 +1,23 @@
+import os
+
+import numpy as np
+
+import magnification_map
+from magnification_map import load_magnification_map
+
+
+def test_disk_cache_keeps_only_recent_maps_within_byte_cap(tmp_path, monkeypatch):
+    # 작은 지도 하나가 약 3 KB이므로 두 개만 남도록 상한을 정함
+    monkeypatch.setattr(magnification_map, 'MAP_CACHE_MAX_BYTES', 7000)
+    (tmp_path / 'finite_source_table.npz').write_bytes(b'table')
+    for q in (1e-3, 2e-3, 3e-3):
+        load_magnification_map(q, 1.0, resolution=20, rays_per_pixel=4, cache_dir=str(tmp_path))
+
+    files = sorted(os.listdir(tmp_path))
+    assert len([name for name in files if name.startswith('map_')]) == 2
+    assert 'finite_source_table.npz' in files
+    assert not any(name.startswith('map_q1.000000e-03') for name in files)
+    # 지워진 지도도 다시 요청하면 계산해서 돌려줌
+    load_magnification_map.cache_clear()
+    reloaded = load_magnification_map(1e-3, 1.0, resolution=20, rays_per_pixel=4, cache_dir=str(tmp_path))
+    assert reloaded.shape == (20, 20) and np.all(np.isfinite(reloaded))
@@ -0,0 +1,107 @@
+import io
+import os
+import time
+
+import numpy as np
+import pytest
+
+from disk_cache import evict_least_recently_used
+from photometry_lod import open_photometry, resolve_data_path
+
+
+def test_malformed_csv_leaves_no_temporary_file(tmp_path):
+    upload = io.BytesIO(b"time,flux\n1,2\n2,not-a-number\n")
+    with pytest.raises(ValueError):
+        open_photometry(upload, cache_dir=str(tmp_path))
+    assert os.listdir(tmp_path) == []
+
+
+def test_unsorted_csv_leaves_no_temporary_file(tmp_path):
+    with pytest.raises(ValueError):
+        open_photometry(io.BytesIO(b"2,1\n1,1\n"), cache_dir=str(tmp_path))
+    assert os.listdir(tmp_path) == []
+
+
+def test_eviction_removes_least_recently_used_files_first(tmp_path):
+    now = time.time()
+    for i, name in enumerate(['old.npy', 'middle.npy', 'new.npy']):
+        path = tmp_path / name
+        path.write_bytes(b'x' * 100)
+        os.utime(path, (now - 100 + i, now - 100 + i))
+    (tmp_path / 'writing.npy.123.tmp.npy').write_bytes(b'x' * 100)
+
+    removed = evict_least_recently_used(str(tmp_path), '*.npy', max_bytes=250)
+    assert removed == 1
+    assert sorted(os.listdir(tmp_path)) == ['middle.npy', 'new.npy', 'writing.npy.123.tmp.npy']
+
+
+def test_eviction_by_age_keeps_requested_file(tmp_path):
+    old = tmp_path / 'old.npy'
+    old.write_bytes(b'x')
+    os.utime(old, (0, 0))
+    kept = tmp_path / 'kept.npy'
+    kept.write_bytes(b'x')
+    os.utime(kept, (0, 0))
+
+    evict_least_recently_used(str(tmp_path), '*.npy', max_bytes=1 << 20, max_age_seconds=60, keep=(str(kept),))
+    assert os.listdir(tmp_path) == ['kept.npy']
+
+
+def test_cached_upload_is_reused(tmp_path):
+    first = open_photometry(io.BytesIO(b"1,2\n2,3\n"), cache_dir=str(tmp_path))
+    second = open_photometry(io.BytesIO(b"1,2\n2,3\n"), cache_dir=str(tmp_path))
+    assert first.filename == second.filename
+    np.testing.assert_array_equal(second, [[1, 2], [2, 3]])
+
+
+def named_upload(name, data):
+    """Streamlit 업로드처럼 이름(name)을 가진 바이너리 버퍼"""
+    upload = io.BytesIO(data)
+    upload.name = name
+    return upload
+
+
+def test_uploads_with_same_name_and_size_do_not_collide(tmp_path):
+    first = open_photometry(named_upload('event.csv', b"1,2\n2,3\n"), cache_dir=str(tmp_path))
+    second = open_photometry(named_upload('event.csv', b"1,5\n2,6\n"), cache_dir=str(tmp_path))
+    assert first.filename != second.filename
+    np.testing.assert_array_equal(first, [[1, 2], [2, 3]])
+    np.testing.assert_array_equal(second, [[1, 5], [2, 6]])
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    data = tmp_path / 'data'
+    (data / 'events').mkdir(parents=True)
+    (data / 'events' / 'inside.csv').write_text("1,2\n")
+    (tmp_path / 'secret.csv').write_text("1,2\n")
+    return data
+
+
+def test_resolve_data_path_accepts_file_inside_data_dir(data_dir):
+    assert resolve_data_path('events/inside.csv', str(data_dir)) == os.path.realpath(data_dir / 'events' / 'inside.csv')
+
+
+@pytest.mark.parametrize('relative_path', ['../secret.csv', 'events/../../secret.csv'])
+def test_resolve_data_path_rejects_parent_traversal(data_dir, relative_path):
+    with pytest.raises(ValueError):
+        resolve_data_path(relative_path, str(data_dir))
+
+
+def test_resolve_data_path_rejects_absolute_path(data_dir):
+    with pytest.raises(ValueError):
+        resolve_data_path(str(data_dir.parent / 'secret.csv'), str(data_dir))
+
+
+def test_resolve_data_path_rejects_symlink_escaping_data_dir(data_dir):
+    os.symlink(data_dir.parent / 'secret.csv', data_dir / 'link.csv')
+    os.symlink(data_dir.parent, data_dir / 'parent')
+    with pytest.raises(ValueError):
+        resolve_data_path('link.csv', str(data_dir))
+    with pytest.raises(ValueError):
+        resolve_data_path('parent/secret.csv', str(data_dir))
+
+
+def test_resolve_data_path_requires_data_dir():
+    with pytest.raises(ValueError):
+        resolve_data_path('events/inside.csv', None)
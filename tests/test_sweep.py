@@ -0,0 +1,25 @@
+import argparse
+
+import numpy as np
+import pytest
+
+from sweep import parse_param_spec
+
+
+def test_parse_param_spec_range_and_list():
+    name, values = parse_param_spec('planet_mass_ratio=1e-4:1e-2:3:log')
+    assert name == 'planet_mass_ratio'
+    np.testing.assert_allclose(values, [1e-4, 1e-3, 1e-2])
+    np.testing.assert_allclose(parse_param_spec('planet_mass_ratio=0:1:3')[1], [0, 0.5, 1])
+    np.testing.assert_allclose(parse_param_spec('planet_mass_ratio=1e-4,2e-4')[1], [1e-4, 2e-4])
+
+
+@pytest.mark.parametrize('spec', [
+    'planet_mass_ratio=1e-4:1e-3',          # 개수 없음
+    'planet_mass_ratio=1e-4:1e-3:5:lin',
+    'planet_mass_ratio=1e-4:1e-3:5:log:x',
+    'no_such_param=1:2:3',
+])
+def test_parse_param_spec_rejects_malformed_spec(spec):
+    with pytest.raises(argparse.ArgumentTypeError):
+        parse_param_spec(spec)